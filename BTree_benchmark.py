@@ -0,0 +1,154 @@
+import sys
+import json
+import time
+import random
+import argparse
+import tracemalloc
+from itertools import islice
+from BTree_complete_implementation import BTree
+
+# share of each operation in a mix
+MIXES = {
+    'insert': {'insert': 1.0},
+    'search': {'search': 1.0},
+    'delete': {'delete': 1.0},
+    'range': {'range': 1.0},
+    'mixed': {'search': 0.5, 'insert': 0.2, 'delete': 0.2, 'range': 0.1},
+}
+RANGE_LENGTH = 100 # keys read by one range operation
+
+
+def make_keys(key_type, count, rng):
+    """
+    Generate count distinct keys of key_type ('int' or 'str') in random order
+    """
+    numbers = rng.sample(range(4*count), count)
+    if key_type == 'str':
+        # scramble so that string order differs from insertion order
+        return [format(i * 2654435761 % 2**32, '08x') for i in numbers]
+    return numbers
+
+def count_nodes(btree):
+    """
+    Count nodes of the BTree
+    """
+    count = 0
+    stack = [btree.root]
+    while stack:
+        node = stack.pop()
+        count += 1
+        if not node.is_leaf():
+            for i in range(node.count+1):
+                stack.append(node.link[i])
+    return count
+
+def percentile(values, fraction):
+    """
+    Get percentile of already sorted values
+    """
+    if len(values) == 0:
+        return 0
+    return values[min(len(values)-1, int(fraction*len(values)))]
+
+def run_case(t, key_type, size, mix, operations, seed=0, **options):
+    """
+    Benchmark one combination of degree, key type, dataset size and mix.
+    The tree is preloaded with size keys (except for the pure insert mix,
+    which inserts them), then operations are timed one by one
+    """
+    rng = random.Random(seed)
+    keys = make_keys(key_type, 2*size, rng)
+    loaded, spare = keys[:size], keys[size:]
+
+    # peak memory of building the full tree is measured in a separate run,
+    # tracing would distort the timings
+    tracemalloc.start()
+    if mix == 'insert':
+        btree = BTree(t, **options)
+        for key in loaded:
+            btree.insert(key)
+    else:
+        btree = BTree.bulk_load(loaded, t=t, **options)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    if mix == 'insert':
+        # fill an empty tree with the dataset itself
+        btree = BTree(t, **options)
+        plan = ['insert' for _ in range(min(operations, size))]
+        spare = loaded
+    else:
+        names = list(MIXES[mix])
+        plan = rng.choices(names, [MIXES[mix][i] for i in names], k=operations)
+
+    latencies = []
+    insert_pos = 0
+    start = time.perf_counter()
+    for operation in plan:
+        if operation == 'insert':
+            key = spare[insert_pos % len(spare)]
+            insert_pos += 1
+            began = time.perf_counter_ns()
+            btree.insert(key)
+        elif operation == 'delete':
+            key = loaded[rng.randrange(size)]
+            began = time.perf_counter_ns()
+            btree.delete(key)
+        elif operation == 'search':
+            key = loaded[rng.randrange(size)]
+            began = time.perf_counter_ns()
+            btree.search(key)
+        else:
+            key = loaded[rng.randrange(size)]
+            began = time.perf_counter_ns()
+            for _ in islice(btree.range(key), RANGE_LENGTH):
+                pass
+        latencies.append(time.perf_counter_ns() - began)
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        't': t,
+        'key_type': key_type,
+        'size': size,
+        'mix': mix,
+        'operations': len(plan),
+        'ops_per_sec': len(plan) / elapsed if elapsed > 0 else 0,
+        'p50_us': percentile(latencies, 0.50) / 1000,
+        'p99_us': percentile(latencies, 0.99) / 1000,
+        'nodes': count_nodes(btree),
+        'peak_memory_bytes': peak_memory,
+    }
+
+def sweep(degrees, key_types, sizes, mixes, operations, **options):
+    """
+    Run every combination of the parameters and collect the results
+    """
+    results = []
+    for size in sizes:
+        for key_type in key_types:
+            for mix in mixes:
+                for t in degrees:
+                    result = run_case(t, key_type, size, mix, operations, **options)
+                    results.append(result)
+                    print(f"t={t:<4} {key_type:<3} size={size:<8} {mix:<6} "
+                          f"{result['ops_per_sec']:>10.0f} ops/s  p50={result['p50_us']:.1f}us  "
+                          f"p99={result['p99_us']:.1f}us  nodes={result['nodes']}  "
+                          f"peak={result['peak_memory_bytes']}", file=sys.stderr)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Sweep BTree degree over key types, sizes and operation mixes')
+    parser.add_argument('--degrees', type=int, nargs='+', default=[2, 3, 8, 16, 32, 64, 128])
+    parser.add_argument('--key-types', nargs='+', choices=['int', 'str'], default=['int', 'str'])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--mixes', nargs='+', choices=list(MIXES), default=list(MIXES))
+    parser.add_argument('--operations', type=int, default=10000)
+    parser.add_argument('--compact', action='store_true', help='use CompactNode layout')
+    parser.add_argument('--output', default='btree_benchmark.json')
+    args = parser.parse_args()
+
+    results = sweep(args.degrees, args.key_types, args.sizes, args.mixes, args.operations, compact=args.compact)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
@@ -0,0 +1,250 @@
+import os
+import sys
+import zlib
+import threading
+from BTree_complete_implementation import BTree, read_file
+
+WAL_FILE = 'wal.log'
+SNAPSHOT_FILE = 'snapshot.txt'
+
+
+class LoggedBTree(BTree):
+    """
+    BTree whose insert and delete commands are appended to a write-ahead log
+    in directory before they are applied. Log records are fsynced in groups
+    of group_size, or by a background timer group_interval seconds after the
+    first record of a group, so a command is durable at most that long after
+    it returned (at once after commit()). Every snapshot_every records the
+    keys are written to a snapshot so that recovery only replays the log
+    tail after it.
+    Keys are stored as text, key_type converts them back (e.g. int)
+    """
+    def __init__(self, directory, t, key_type=str, group_size=64, group_interval=0.05,
+                 snapshot_every=100000, **options):
+        super().__init__(t, **options)
+        self.directory = directory
+        self.key_type = key_type
+        self.options = options
+        self.group_size = group_size # records per fsync
+        self.group_interval = group_interval # seconds before a pending record is fsynced
+        self.snapshot_every = snapshot_every
+        self.lsn = 0 # sequence number of the last logged command
+        self.pending = 0 # records written but not fsynced yet
+        self.lock = threading.Lock() # guards the log against the flush timer
+        self.timer = None # flushes pending records once group_interval has passed
+        self.since_snapshot = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self.wal_path = os.path.join(directory, WAL_FILE)
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+        self.recover()
+        self.wal = open(self.wal_path, 'a')
+
+    def recover(self):
+        """
+        Rebuild the tree from the last snapshot and the log records after it.
+        A torn or corrupted record at the end of the log is cut off
+        """
+        snapshot_lsn = 0
+        if os.path.exists(self.snapshot_path):
+            lines = read_file(self.snapshot_path)
+            snapshot_lsn = int(lines[0].split()[1])
+            keys = [self.key_type(i) for i in lines[1:] if i != '']
+            self.root = BTree.bulk_load(keys, presorted=True, t=self.t, **self.options).root
+        self.lsn = snapshot_lsn
+
+        if not os.path.exists(self.wal_path):
+            return
+        valid_end = 0
+        with open(self.wal_path, 'rb') as f:
+            for line in f:
+                record = parse_record(line)
+                if record is None:
+                    break
+                lsn, command, key = record
+                valid_end += len(line)
+                if lsn <= snapshot_lsn:
+                    # already contained in the snapshot
+                    continue
+                self.apply(command, self.key_type(key))
+                self.lsn = lsn
+                self.since_snapshot += 1
+        if valid_end != os.path.getsize(self.wal_path):
+            with open(self.wal_path, 'r+b') as f:
+                f.truncate(valid_end)
+
+    @classmethod
+    def bulk_load(cls, iterable, presorted=False, t=2, **options):
+        """
+        Build the tree bottom-up like BTree.bulk_load and write the keys to a
+        snapshot so that they survive a restart. The directory must not hold
+        a logged tree yet, its keys would be dropped
+        """
+        btree = super().bulk_load(iterable, presorted, t, **options)
+        if btree.lsn != 0:
+            btree.close()
+            raise ValueError(f'{btree.directory} already holds a logged tree')
+        btree.snapshot()
+        return btree
+
+    def apply(self, command, key):
+        """
+        Apply a command to the tree without logging it
+        """
+        if command == 'delete':
+            return super().delete(key)
+        return super().insert(key)
+
+    def log(self, command, key):
+        """
+        Append a command to the log, fsyncing once the group is full and
+        starting the flush timer for the first record of a group
+        """
+        with self.lock:
+            self.lsn += 1
+            self.wal.write(format_record(self.lsn, command, key))
+            self.pending += 1
+            if self.pending >= self.group_size:
+                self.sync()
+            elif self.timer is None:
+                self.timer = threading.Timer(self.group_interval, self.commit)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def commit(self):
+        """
+        Make all logged commands durable
+        """
+        with self.lock:
+            self.sync()
+
+    def sync(self):
+        """
+        Flush and fsync pending records, the lock has to be held
+        """
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.pending == 0:
+            return
+        self.wal.flush()
+        os.fsync(self.wal.fileno())
+        self.pending = 0
+
+    def insert(self, key):
+        """
+        Log and insert key, returns False if key already exists
+        """
+        self.log('insert', key)
+        result = self.apply('insert', key)
+        self.after_command()
+        return result
+
+    def insert_many(self, keys):
+        """
+        Log every key of a batch, then insert them with one descent per leaf
+        """
+        keys = list(keys)
+        for key in keys:
+            self.log('insert', key)
+        result = super().insert_many(keys)
+        self.after_command(len(keys))
+        return result
+
+    def delete(self, key):
+        """
+        Log and delete key, returns False if key does not exist
+        """
+        self.log('delete', key)
+        result = self.apply('delete', key)
+        self.after_command()
+        return result
+
+    def after_command(self, count=1):
+        self.since_snapshot += count
+        if self.since_snapshot >= self.snapshot_every:
+            self.snapshot()
+
+    def snapshot(self):
+        """
+        Write all keys to a new snapshot and start an empty log.
+        The snapshot replaces the old one atomically, so a crash at any point
+        leaves either the old or the new snapshot together with a usable log
+        """
+        self.commit()
+        temp_path = self.snapshot_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            f.write(f'lsn {self.lsn}\n')
+            for key in self:
+                f.write(f'{key}\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.snapshot_path)
+        sync_directory(self.directory)
+
+        # records up to lsn are in the snapshot now
+        self.wal.close()
+        self.wal = open(self.wal_path, 'w')
+        self.since_snapshot = 0
+
+    def close(self):
+        self.commit()
+        self.wal.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def format_record(lsn, command, key):
+    """
+    Format a log record as 'lsn crc command key', crc covers the other fields
+    """
+    body = f'{lsn} {command} {key}'
+    return f'{lsn} {zlib.crc32(body.encode()):08x} {command} {key}\n'
+
+def parse_record(line):
+    """
+    Parse a log record, returns None for a torn or corrupted record
+    """
+    if not line.endswith(b'\n'):
+        return None
+    fields = line[:-1].decode(errors='replace').split(' ', 3)
+    if len(fields) != 4 or not fields[0].isdigit():
+        return None
+    lsn, crc, command, key = fields
+    if f'{zlib.crc32(f"{lsn} {command} {key}".encode()):08x}' != crc:
+        return None
+    return int(lsn), command, key
+
+def sync_directory(directory):
+    """
+    Make a rename inside directory durable where the platform supports it
+    """
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+if __name__ == "__main__":
+    # apply a file of 'insert x' / 'delete x' commands durably, then dump the keys
+    _, directory, command_file = sys.argv
+    with LoggedBTree(directory, 2) as btree:
+        for i in read_file(command_file):
+            command = i.split(" ")
+            if len(command) < 2:
+                continue
+            if command[0] == "delete":
+                btree.delete(command[1])
+            else:
+                btree.insert(command[1])
+
+        with open("output_q2.txt", "w") as f:
+            result = btree.traverse()
+            f.write("\n".join(result))
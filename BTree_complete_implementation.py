@@ -1,12 +1,135 @@
 import sys 
 import random
+import tracemalloc
+from array import array
+from bisect import bisect_left, bisect_right
+
 class BTree:
-    def __init__(self, t):
+    def __init__(self, t, compact=False, typecode=None, logger=None, order_statistics=False):
         """
-        Initialize BTree with degree parameter t
+        Initialize BTree with degree parameter t.
+        compact=True stores nodes as CompactNode (__slots__, fixed capacity),
+        typecode (e.g. 'q') additionally packs integer keys into a typed array,
+        logger (e.g. logging.Logger) receives debug traces of the mutations,
+        order_statistics=True keeps subtree sizes for rank, select and count
         """
         self.t = t
-        self.root = Node(t)
+        self.compact = compact or typecode is not None
+        self.typecode = typecode
+        self.logger = logger
+        self.order_statistics = order_statistics
+        self.root = self.new_node()
+
+    def trace(self, message, *args):
+        """
+        Send a debug trace to the logger, formatting is left to the logger
+        so that nothing is done when no logger is set
+        """
+        if self.logger is not None:
+            self.logger.debug(message, *args)
+
+    def new_node(self):
+        """
+        Create an empty node with the layout selected for this tree
+        """
+        if self.compact:
+            return CompactNode(self.t, self.typecode)
+        return Node(self.t)
+
+    @classmethod
+    def bulk_load(cls, iterable, presorted=False, t=2, **options):
+        """
+        Build a BTree bottom-up from a stream of keys in O(n)
+        (O(n log n) when the keys still have to be sorted)
+        """
+        if not presorted:
+            iterable = sorted(iterable)
+
+        # drop duplicate keys, same as insert would do
+        keys = []
+        for key in iterable:
+            if keys and key == keys[-1]:
+                continue
+            if keys and key < keys[-1]:
+                raise ValueError('presorted keys are not in ascending order')
+            keys.append(key)
+
+        btree = cls(t=t, **options)
+        btree.load(keys)
+        return btree
+
+    def load(self, keys):
+        """
+        Auxiliary function for bulk_load to build the levels of an empty
+        BTree from sorted keys without duplicates
+        """
+        if len(keys) == 0:
+            return
+
+        # build the leaf level, then group the children level by level
+        # until everything fits under a single root
+        nodes, keys = self.build_level(keys)
+        while len(nodes) > 1:
+            nodes, keys = self.build_level(keys, nodes)
+        self.root = nodes[0]
+
+    def build_level(self, keys, children=None):
+        """
+        Auxiliary function for bulk_load to pack one level of the BTree.
+        Splits the sorted keys into nodes that are as full as possible and
+        returns the nodes together with the separator keys for the level above
+        """
+        t = self.t
+        if children is None:
+            # every leaf takes up to 2t-1 keys plus one separator
+            group_count = -(-(len(keys)+1) // (2*t))
+            item_count = len(keys) - group_count + 1
+        else:
+            # every internal node takes up to 2t children
+            group_count = -(-len(children) // (2*t))
+            item_count = len(children)
+
+        nodes = []
+        separators = []
+        key_pos = 0
+        child_pos = 0
+        for g in range(group_count):
+            # spread the items evenly so that no node drops below the minimum
+            size = item_count // group_count + (1 if g < item_count % group_count else 0)
+            node = self.new_node()
+            if children is None:
+                node_keys = size
+            else:
+                node_keys = size - 1
+                for i in range(size):
+                    node.link[i] = children[child_pos]
+                    child_pos += 1
+            for i in range(node_keys):
+                node.key[i] = keys[key_pos]
+                key_pos += 1
+            node.count = node_keys
+            if self.order_statistics:
+                node.update_size()
+            nodes.append(self.packed(node))
+
+            # key between this node and the next one goes to the parent
+            if g < group_count - 1:
+                separators.append(keys[key_pos])
+                key_pos += 1
+        return nodes, separators
+
+    def packed(self, node):
+        """
+        Hook called by build_level for every finished node, returns what the
+        level above links to. DiskBTree writes the node out and keeps its page id
+        """
+        return node
+
+    def child(self, node, index):
+        """
+        Get child of node at index that the current mutation is about to change
+        """
+        return node.link[index]
 
     def search(self, key):
         """
@@ -21,115 +144,186 @@ class BTree:
         if node is None:
             return False
         i = node.get_index_by_key(key)  
-        if node.key[i] is None:
-            return False
-        elif key == node.key[i]:  
+        if i < node.count and key == node.key[i]:  
             return True
-        elif key< node.key[i]:
-            return self.search_btree(node.link[i], key)
-        else:
-            return self.search_btree(node.link[i+1], key)
+        return self.search_btree(node.link[i], key)
 
-    def insert(self, key):
+    def search_many(self, keys):
         """
-        Insert key into BTree
+        Search for a batch of keys, keys that share a path are looked up in a
+        single descent. Returns whether each key exists, in input order
         """
-        exist = self.search(key)
-        if exist:
-            print(f'{key} already exists')
-        else:
-            # if root is full, split root
-            if self.root.key_full():
-                new_root = self.root.split_node()
-                self.root = new_root
-            self.insert_btree(self.root, key)
-
-
-    def delete(self, key):
-        """
-        Delete key from BTree
-        """
-        print(f'deleting {key}')
-        exist = self.search(key)
-        if not exist:
-            print(f'{key} does not exist')
-        else:
-            self.delete_btree(self.root, key, self.t)
+        keys = list(keys)
+        result = [False for _ in range(len(keys))]
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        sorted_keys = [keys[i] for i in order]
+        self.search_many_btree(self.root, sorted_keys, order, 0, len(order), result)
+        return result
 
-        
-    def insert_btree(self, node, key):
+    def search_many_btree(self, node, sorted_keys, order, start, end, result):
         """
-        Auxiliary function to insert key into BTree
+        Auxiliary function to search for sorted_keys[start:end] in subtree of node
         """
+        while start < end:
+            key = sorted_keys[start]
+            i = node.get_index_by_key(key)
+            if i < node.count and key == node.key[i]:
+                result[order[start]] = True
+                start += 1
+                continue
 
+            # every key smaller than key[i] continues into the same child
+            if i < node.count:
+                stop = bisect_left(sorted_keys, node.key[i], start, end)
+            else:
+                stop = end
+            if not node.is_leaf():
+                self.search_many_btree(node.link[i], sorted_keys, order, start, stop, result)
+            start = stop
+
+    def insert_many(self, keys):
+        """
+        Insert a batch of keys in sorted order. Neighbouring keys that belong to
+        the same leaf are added without descending from the root again.
+        Returns whether each key was inserted, in input order
+        """
+        keys = list(keys)
+        result = [False for _ in range(len(keys))]
+        leaf = None
+        for j in sorted(range(len(keys)), key=keys.__getitem__):
+            key = keys[j]
+            if leaf is not None and not leaf.key_full() and (lo is None or lo < key) and (hi is None or key < hi) \
+                    and not self.order_statistics:
+                # key is within the bounds of the last leaf, so it can only be there
+                i = leaf.get_index_by_key(key)
+                if i < leaf.count and key == leaf.key[i]:
+                    continue
+                leaf.add_to_key(key)
+                result[j] = True
+            else:
+                leaf, lo, hi = self.insert_to_leaf(key)
+                result[j] = leaf is not None
+        return result
 
-        # 
-        if node.is_leaf() and not node.key_full():
-            # if node is not full
-            node.add_to_key(key)    
-        else:
-            # get the next node to enter
-            next_node = node.get_link_by_key(key)
-
-            # if next node is full, split node
+    def insert_to_leaf(self, key):
+        """
+        Insert key with a single descent, splitting full nodes on the way.
+        Returns the leaf together with the separator keys bounding it,
+        or (None, None, None) if key already exists
+        """
+        # if root is full, split root
+        if self.root.key_full():
+            self.root = self.root.split_node()
+            if self.order_statistics:
+                self.update_split_sizes(self.root, 0)
+                self.root.update_size()
+
+        node = self.root
+        path = [node]
+        lo = hi = None
+        while True:
+            i = node.get_index_by_key(key)
+            if i < node.count and key == node.key[i]:
+                return None, None, None
+            if node.is_leaf():
+                node.add_to_key(key)
+                if self.order_statistics:
+                    self.update_sizes(path)
+                return node, lo, hi
+
+            next_node = self.child(node, i)
             if next_node.key_full():
-                parent = next_node.split_node(node)
-                next_node = parent.get_link_by_key(key)
+                # split moves the median up into node, look at node again
+                next_node.split_node(node)
+                if self.order_statistics:
+                    self.update_split_sizes(node, i)
+                continue
+
+            # narrow bounds of the subtree to the keys around link i
+            if i > 0:
+                lo = node.key[i-1]
+            if i < node.count:
+                hi = node.key[i]
+            node = next_node
+            path.append(node)
 
-            # recursively insert key into next node
-            self.insert_btree(next_node, key)
+    def insert(self, key):
+        """
+        Insert key into BTree, returns False if key already exists
+        """
+        inserted = self.insert_to_leaf(key)[0] is not None
+        if not inserted:
+            self.trace('%s already exists', key)
+        return inserted
 
+    def delete(self, key):
+        """
+        Delete key from BTree, returns False if key does not exist
+        """
+        self.trace('deleting %s', key)
+        path = [] if self.order_statistics else None
+        deleted = self.delete_btree(self.root, key, self.t, path)
+        if path:
+            self.update_sizes(path)
+        if not deleted:
+            self.trace('%s does not exist', key)
+        return deleted
 
-    def delete_btree(self, node, key, t):
+    def delete_btree(self, node, key, t, path=None):
         """
-        Auxiliary function to delete key from BTree
+        Auxiliary function to delete key from BTree. Nodes on the way are
+        refilled before entering them, so a missing key is only noticed at
+        the leaf and the tree stays valid. Returns whether key was deleted,
+        visited nodes are collected in path if given
         """
+        if path is not None:
+            path.append(node)
         key_index = node.get_index_by_key(key)
         if node.is_leaf():
             # if node is leaf, can directly delete key
-            node.remove_from_key(key)
-        elif node.key[key_index] == key:
+            deleted = node.remove_from_key(key)
+            if deleted:
+                self.trace('deleted %s', key)
+            return deleted
+        elif key_index < node.count and node.key[key_index] == key:
             # if key is found in internal node
-            print("key found", key, "at index", key_index, "in internal node")
+            self.trace('key found %s at index %s in internal node', key, key_index)
 
             if not node.link[key_index].key_min():
                 # left child has key to be deleted
                 # replace key with predecessor and delete predecessor
-                print("predecessor found")
+                self.trace('predecessor found')
                 key = self.get_predecessor(node.link[key_index])
                 node.key[key_index] = key
-                node = node.link[key_index]
-                print("removed key", key)
+                node = self.child(node, key_index)
+                self.trace('removed key %s', key)
 
             elif not node.link[key_index+1].key_min():
                 # right child has key to be deleted
                 # replace key with successor and delete successor
-                print("successor found")
+                self.trace('successor found')
                 key = self.get_successor(node.link[key_index+1])
                 node.key[key_index] = key
-                node = node.link[key_index+1]
-                print("removed key", key)
+                node = self.child(node, key_index+1)
+                self.trace('removed key %s', key)
             else:
                 # if both child cannot be deleted
                 # merge node
-                print("both predecessor and successor are at min")
+                self.trace('both predecessor and successor are at min')
                 node = self.merge_node(node, key_index)
                     
             # recursively delete key from node
-            self.delete_btree(node, key, t)
+            return self.delete_btree(node, key, t, path)
 
         else:
-            # move to next node
+            # move to next node, key can only be in the subtree at key_index
+            next_node = self.child(node, key_index)
 
-            if node.key[key_index] < key:
-                # if key is in right subtree, child node is key_index+1, sibling is key_index
-                next_node = node.link[key_index+1]
-                next_node_index = key_index+1
-                sibling_index = key_index
+            if key_index > 0:
+                # use left sibling, separated by key at key_index-1
+                sibling_index = key_index-1
             else:
-                # if key is in left subtree, child node is key_index, sibling is key_index+1
-                next_node = node.link[key_index]
-                next_node_index = key_index
+                # first child only has a right sibling, separated by key at key_index
                 sibling_index = key_index+1
 
             if next_node.key_min():
@@ -137,62 +331,135 @@ class BTree:
 
                 if not node.link[sibling_index].key_min():
                     # sibling has key to be borrowed, borrow from sibling
-                    sibling = node.link[sibling_index]
+                    sibling = self.child(node, sibling_index)
 
-                    if sibling_index == key_index :
+                    if sibling_index < key_index :
                          # borrow from left sibling
-                        print("borrow from left sibling")
-                       
-                        next_node.key.insert(0, node.key[sibling_index])
-                        next_node.link.insert(0, sibling.link[sibling.count])
+                        self.trace('borrow from left sibling')
+
+                        # shift keys and links right to make space at the front
+                        next_node.key[1:next_node.count+1] = next_node.key[0:next_node.count]
+                        next_node.link[1:next_node.count+2] = next_node.link[0:next_node.count+1]
+                        next_node.key[0] = node.key[sibling_index]
+                        next_node.link[0] = sibling.link[sibling.count]
                         next_node.count += 1
                         node.key[sibling_index] = sibling.key[sibling.count-1]
-                        sibling.key[sibling.count-1] = None
-                        sibling.link[sibling.count] = None
-                        sibling.count -= 1
+                        sibling.truncate(sibling.count-1)
                     else:
                         # borrow from right sibling
-                        print("borrow from right sibling")
+                        self.trace('borrow from right sibling')
                         
                         next_node.key[next_node.count] = node.key[key_index]
+                        next_node.link[next_node.count+1] = sibling.link[0]
                         next_node.count += 1
-                        next_node.link[next_node.count] = sibling.link.pop(0)
-                        sibling.link.append(None)
-                        sibling.count -= 1
-                        node.key[key_index] = sibling.key.pop(0)
-                        sibling.key.append(None)
+                        node.key[key_index] = sibling.key[0]
+
+                        # shift keys and links of sibling left to fill the gap
+                        sibling.key[0:sibling.count-1] = sibling.key[1:sibling.count]
+                        sibling.link[0:sibling.count] = sibling.link[1:sibling.count+1]
+                        sibling.truncate(sibling.count-1)
+
+                    # sibling is not on the path, its size changes right here
+                    if path is not None:
+                        sibling.update_size()
                 else:
                     # merge node if sibling cannot borrow
-                    print("merge node")
-                    next_node = self.merge_node(node, key_index)
+                    self.trace('merge node')
+                    next_node = self.merge_node(node, min(key_index, sibling_index))
 
-            self.delete_btree(next_node, key, t)
+            return self.delete_btree(next_node, key, t, path)
+
+    def update_sizes(self, path):
+        """
+        Recompute subtree sizes of the nodes on a root-to-leaf path, bottom-up
+        """
+        for node in reversed(path):
+            node.update_size()
+
+    def update_split_sizes(self, parent, index):
+        """
+        Recompute subtree sizes of both halves of a split below parent at index
+        """
+        parent.link[index].update_size()
+        parent.link[index+1].update_size()
+
+    def rank(self, key):
+        """
+        Count keys smaller than key in O(t log n), needs order_statistics
+        """
+        self.check_order_statistics()
+        result = 0
+        node = self.root
+        while node is not None:
+            i = node.get_index_by_key(key)
+            # keys before i and the subtrees left of them are all smaller
+            result += i
+            if not node.is_leaf():
+                for j in range(i):
+                    result += node.link[j].size
+            if i < node.count and key == node.key[i]:
+                if not node.is_leaf():
+                    result += node.link[i].size
+                return result
+            node = node.link[i]
+        return result
+
+    def select(self, k):
+        """
+        Get the k-th smallest key (from 0) in O(t log n), needs order_statistics
+        """
+        self.check_order_statistics()
+        if k < 0 or k >= self.root.size:
+            raise IndexError('select index out of range')
+        node = self.root
+        while True:
+            for i in range(node.count+1):
+                # skip subtree left of key i if k is past it
+                size = 0 if node.is_leaf() else node.link[i].size
+                if k < size:
+                    node = node.link[i]
+                    break
+                k -= size
+                if k == 0:
+                    return node.key[i]
+                k -= 1
+
+    def count(self, lo=None, hi=None):
+        """
+        Count keys with lo <= key < hi in O(t log n), needs order_statistics
+        """
+        self.check_order_statistics()
+        result = self.root.size
+        if hi is not None:
+            result = self.rank(hi)
+        if lo is not None:
+            result -= self.rank(lo)
+        return max(result, 0)
+
+    def check_order_statistics(self):
+        if not self.order_statistics:
+            raise ValueError('BTree was created without order_statistics')
 
     def merge_node(self, node, index):
         """
         Merge two nodes based on index
         """
 
-        left = node.link[index]  # left node to merge
+        left = self.child(node, index)  # left node to merge
         right = node.link[index+1]  # right node to merge
 
         left.key[left.count] = node.key[index]  # copy key from parent to left node
         left.count += 1
 
-        # copy keys and links from right node to left node
-        for i in range(right.count):
-            left.key[left.count] = right.key[i]
-            left.link[left.count] = right.link[i]
-            left.count += 1
-
-        left.link[left.count] = right.link[right.count]  # copy last link from right node to left node
+        # copy keys and links (including the last link) from right node to left node
+        left.key[left.count:left.count+right.count] = right.key[0:right.count]
+        left.link[left.count:left.count+right.count+1] = right.link[0:right.count+1]
+        left.count += right.count
 
         # remove key and link to right node from parent node
-        node.link.pop(index+1)
-        node.key.pop(index)
-        node.key.append(None)
-        node.link.append(None)
-        node.count -= 1
+        node.key[index:node.count-1] = node.key[index+1:node.count]
+        node.link[index+1:node.count] = node.link[index+2:node.count+1]
+        node.truncate(node.count-1)
 
         if node == self.root and node.count == 0:
             # if the merged node is root and has no keys, set the left node as root
@@ -212,7 +479,7 @@ class BTree:
         Auxilary function to pretty print the BTree
         """
         if node is not None:
-            print(f'level {level}: {node.key} , count={node.count}')
+            print(f'level {level}: {list(node.key[:node.count])} , count={node.count}')
             for i in range(node.count+1):
                 self.pretty_print(node.link[i], level+1)
 
@@ -220,20 +487,44 @@ class BTree:
         """
         Traverse the entire BTree and collect all keys
         """
-        return self.traverse_btree(self.root)
-    
-    def traverse_btree(self, node):
+        return list(self)
+
+    def __iter__(self):
         """
-        Auxilary function to traverse the entire BTree recursively
+        Iterate over all keys in ascending order
         """
-        result = []
-        if node is not None:
-            for i in range(node.count):
-                result.extend(self.traverse_btree(node.link[i]))
-                result.append(node.key[i])
-            result.extend(self.traverse_btree(node.link[node.count]))
-        return result
+        return self.range()
+
+    def range(self, lo=None, hi=None):
+        """
+        Lazily yield keys with lo <= key < hi in ascending order,
+        None leaves that side of the range open
+        """
+        # stack of (node, index of the next key to yield in node)
+        stack = []
+
+        # descend straight to the first key not smaller than lo
+        node = self.root
+        while node is not None:
+            i = 0 if lo is None else node.get_index_by_key(lo)
+            stack.append((node, i))
+            node = node.link[i]
 
+        while stack:
+            node, i = stack.pop()
+            if i < node.count:
+                key = node.key[i]
+                if hi is not None and not key < hi:
+                    return
+                yield key
+
+                # continue with the rest of this node after the subtree right of key
+                stack.append((node, i+1))
+                child = node.link[i+1]
+                while child is not None:
+                    stack.append((child, 0))
+                    child = child.link[0]
+    
     def get_successor(self, node):
         """
         Get successor in subtree
@@ -253,12 +544,12 @@ class BTree:
     
 
 
-class Node:
-    def __init__(self, t):
-        self.t = t
-        self.count = 0
-        self.key = [None for _ in range(2*t)]
-        self.link = [None for _ in range(2*t)]
+class BaseNode:
+    """
+    Operations shared by all node layouts. Every method only looks at the
+    first count keys and count+1 links, the remaining slots are spare capacity
+    """
+    __slots__ = ()
 
     def is_leaf(self):
         # check if node is leaf
@@ -267,109 +558,102 @@ class Node:
     
     def get_index_by_key(self,key):
         """
-        Get index by key using binary search
-        """
-        left = 0
-        right = self.count-1
-        mid = (left+right)//2
-        while left <= right:
-            mid = (left+right)//2
-            if self.key[mid] == key:
-                return mid
-            elif self.key[mid] < key:
-                left = mid+1
-            else:
-                right = mid-1
-        return mid
+        Get index of the first key that is not smaller than key using binary search
+        """
+        return bisect_left(self.key, key, 0, self.count)
 
     def get_link_by_key(self, key):
         """
         Get next node to by key
         """
-
-        index = self.get_index_by_key(key)
-        if self.key[index] is None or key < self.key[index]:
-            next_node = self.link[index]
-        else:
-            next_node = self.link[index+1]
-        return next_node
+        return self.link[bisect_right(self.key, key, 0, self.count)]
 
     def add_to_key(self, key):
         """
         Add key to node
         """
-
-
-        if self.count == 0:
-            # if node is empty, add key to start
-            self.key[0] = key
-            index1 = 0
-        else:
-            # find index to insert key
-            index1 = self.get_index_by_key(key)
-            if key < self.key[index1]:
-                self.key.insert(index1, key)
-            else:
-                self.key.insert(index1+1, key)
-                index1 += 1
-
+        # find index to insert key and shift the larger keys to the right
+        index1 = self.get_index_by_key(key)
+        self.key[index1+1:self.count+1] = self.key[index1:self.count]
+        self.key[index1] = key
         self.count += 1
 
-        # remove last key if node is full
-        if len(self.key) > 2*self.t:
-            self.key.pop()
-
         return index1
 
     def split_node(self, parent=None):
         """
-        Split node into two by median
+        Split node into two by median, the node itself keeps the left half
         """
         
         if parent is None:
-            parent = Node(self.t)
+            parent = self.new_sibling()
             
-        # create new nodes
-        new_node_left = Node(self.t)
-        new_node_right = Node(self.t)
+        # create new node for the right half
+        new_node_right = self.new_sibling()
 
         mid = self.count//2
-
-        # copy keys and links to new nodes
-        for i in range(mid):
-            new_node_left.key[i] = self.key[i]
-            new_node_left.link[i] = self.link[i]
-            new_node_left.count += 1
-        new_node_left.link[mid] = self.link[mid]
-
-        for i in range(mid+1, self.count):
-            new_node_right.key[i-mid-1] = self.key[i]
-            new_node_right.link[i-mid-1] = self.link[i]
-            new_node_right.count += 1
-
-        new_node_right.link[self.count-mid-1] = self.link[self.count]
-
-        # set median key to parent
-        index = parent.add_to_key(self.key[mid])
-        parent.link.pop(index)
-        parent.link.insert(index, new_node_left)
-        parent.link.insert(index+1, new_node_right)
+        median = self.key[mid]
+        right_count = self.count-mid-1
+
+        # copy keys and links to new node
+        new_node_right.key[0:right_count] = self.key[mid+1:self.count]
+        if not self.is_leaf():
+            new_node_right.link[0:right_count+1] = self.link[mid+1:self.count+1]
+        new_node_right.count = right_count
+        self.truncate(mid)
+
+        # set median key to parent and link both halves after it
+        index = parent.add_to_key(median)
+        parent.link[index+2:parent.count+1] = parent.link[index+1:parent.count]
+        parent.link[index] = self
+        parent.link[index+1] = new_node_right
 
         return parent
 
     def remove_from_key(self, key):
         """
-        Remove key from node
+        Remove key from node, returns False if key is not in node
         """
         i = self.get_index_by_key(key)
 
-        if key == self.key[i]:
-            deleted = self.key.pop(i)
-            self.key.append(None)
-            print("deleted", deleted)
-            self.count -= 1
-        else:
-            print("key not found")
+        if i < self.count and key == self.key[i]:
+            # shift the larger keys to the left over the deleted key
+            self.key[i:self.count-1] = self.key[i+1:self.count]
+            self.truncate(self.count-1)
+            return True
+        return False
+
+    def copy(self):
+        """
+        Create a copy of the node with the same keys and links
+        """
+        node = self.new_sibling()
+        node.key[:] = self.key
+        node.link[:] = self.link
+        node.count = self.count
+        node.size = self.size
+        return node
+
+    def truncate(self, count):
+        """
+        Shrink node to count keys and release the slots after them
+        """
+        removed = self.count - count
+        if type(self.key) is list:
+            self.key[count:self.count] = [None]*removed
+        if not self.is_leaf():
+            self.link[count+1:self.count+1] = [None]*removed
+        self.count = count
+
+    def update_size(self):
+        """
+        Recompute number of keys in the subtree from the children
+        """
+        size = self.count
+        if not self.is_leaf():
+            for i in range(self.count+1):
+                size += self.link[i].size
+        self.size = size
 
     def key_full(self):
         return self.count == 2*self.t-1
@@ -377,6 +661,59 @@ class Node:
     def key_min(self):
         return self.count == self.t-1
 
+
+class Node(BaseNode):
+    def __init__(self, t):
+        self.t = t
+        self.count = 0
+        self.size = 0 # keys in subtree, only kept up to date with order_statistics
+        self.key = [None for _ in range(2*t)]
+        self.link = [None for _ in range(2*t)]
+
+    def new_sibling(self):
+        """
+        Create an empty node with the same layout
+        """
+        return Node(self.t)
+
+
+class CompactNode(BaseNode):
+    """
+    Node without instance dict and with exactly 2t-1 key slots.
+    Keys are kept in a typed array when a typecode is given
+    """
+    __slots__ = ('t', 'count', 'size', 'key', 'link')
+
+    def __init__(self, t, typecode=None):
+        self.t = t
+        self.count = 0
+        self.size = 0
+        if typecode is None:
+            self.key = [None] * (2*t-1)
+        else:
+            self.key = array(typecode, [0]) * (2*t-1)
+        self.link = [None] * (2*t)
+
+    def new_sibling(self):
+        """
+        Create an empty node with the same layout
+        """
+        if type(self.key) is array:
+            return CompactNode(self.t, self.key.typecode)
+        return CompactNode(self.t)
+
+
+def measure_layout(keys, t, **options):
+    """
+    Measure memory (current, peak) allocated while bulk loading keys into a
+    BTree, options are passed on to BTree.bulk_load to select the node layout
+    """
+    tracemalloc.start()
+    btree = BTree.bulk_load(keys, t=t, **options)
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, peak
+
 def read_file(file_path: str) -> str:
     """
     Reads the contents of a file and returns it as a string.
@@ -0,0 +1,137 @@
+import sys
+import time
+import random
+import threading
+from BTree_complete_implementation import BTree
+
+
+class ConcurrentBTree(BTree):
+    """
+    BTree for many reader threads and a single writer using copy-on-write.
+    A mutation copies every node it changes, starting from a copy of the root,
+    and publishes the new root when it is done. Readers always start from the
+    last published root, whose nodes are never changed, so they take no lock
+    """
+    def __init__(self, t, compact=False, typecode=None, logger=None, order_statistics=False):
+        self.write_lock = threading.Lock() # serializes writers
+        self.writer = None # thread id of the writer in the middle of a mutation
+        self.fresh = set() # ids of nodes copied by the current mutation
+        super().__init__(t, compact, typecode, logger, order_statistics)
+
+    @property
+    def root(self):
+        # writer works on its private root, everyone else sees the published one
+        if self.writer == threading.get_ident():
+            return self.working_root
+        return self.published_root
+
+    @root.setter
+    def root(self, node):
+        self.working_root = node
+        if self.writer != threading.get_ident():
+            self.published_root = node
+
+    def child(self, node, index):
+        """
+        Get child of node at index, copying it first if it is still shared
+        with the published tree
+        """
+        child = node.link[index]
+        if id(child) not in self.fresh:
+            child = child.copy()
+            self.fresh.add(id(child))
+            node.link[index] = child
+        return child
+
+    def mutate(self, operation, *args):
+        """
+        Run operation as a copy-on-write mutation and publish its result
+        """
+        with self.write_lock:
+            root = self.published_root.copy()
+            self.fresh = {id(root)}
+            self.working_root = root
+            self.writer = threading.get_ident()
+            try:
+                result = operation(*args)
+                self.published_root = self.working_root
+            finally:
+                self.writer = None
+                self.fresh = set()
+        return result
+
+    def insert(self, key):
+        """
+        Insert key into BTree, returns False if key already exists
+        """
+        return self.mutate(super().insert, key)
+
+    def delete(self, key):
+        """
+        Delete key from BTree, returns False if key does not exist
+        """
+        return self.mutate(super().delete, key)
+
+    def insert_many(self, keys):
+        """
+        Insert a batch of keys as a single mutation
+        """
+        return self.mutate(super().insert_many, keys)
+
+
+def stress_benchmark(size=100000, readers=4, duration=2.0, writer=True, t=16):
+    """
+    Run reader threads doing random searches, optionally against one writer
+    thread doing random inserts and deletes, for duration seconds.
+    Returns the number of operations and throughput of readers and writer
+    """
+    btree = ConcurrentBTree.bulk_load(range(0, 2*size, 2), presorted=True, t=t)
+    stop = threading.Event()
+    read_counts = [0 for _ in range(readers)]
+    write_count = [0]
+
+    def reader(index):
+        rng = random.Random(index)
+        count = 0
+        while not stop.is_set():
+            btree.search(rng.randrange(2*size))
+            count += 1
+        read_counts[index] = count
+
+    def write():
+        rng = random.Random(readers)
+        count = 0
+        while not stop.is_set():
+            key = rng.randrange(2*size)
+            if rng.random() < 0.5:
+                btree.insert(key)
+            else:
+                btree.delete(key)
+            count += 1
+        write_count[0] = count
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    if writer:
+        threads.append(threading.Thread(target=write))
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return {
+        'reads': sum(read_counts),
+        'writes': write_count[0],
+        'reads_per_sec': sum(read_counts) / elapsed,
+        'writes_per_sec': write_count[0] / elapsed,
+    }
+
+
+if __name__ == "__main__":
+    readers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    for writer in (False, True):
+        result = stress_benchmark(readers=readers, writer=writer)
+        print(f'readers={readers} writer={writer}: {result["reads_per_sec"]:.0f} reads/s, {result["writes_per_sec"]:.0f} writes/s')
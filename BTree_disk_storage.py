@@ -0,0 +1,402 @@
+import os
+import sys
+import mmap
+import struct
+from array import array
+from collections import OrderedDict
+from BTree_complete_implementation import BTree, BaseNode
+
+HEADER = struct.Struct('<4sqqqqqq') # magic, t, page size, root page, page count, free page, clean
+MAGIC = b'BTRE'
+COUNT = struct.Struct('<q')
+FREE_PAGE = -1 # count stored in a page that is on the free list
+
+
+class DiskBTree(BTree):
+    """
+    BTree of integer keys stored in a file, one fixed-size page per node.
+    Page 0 holds the header, a link to page 0 means no child.
+    Nodes are read through mmap and cached in an LRU buffer pool,
+    reopening the file gives back the tree without rebuilding it.
+    flush() and close() mark the file clean, the first change after them
+    marks it dirty again. A dirty file is rejected on reopen, as pages
+    evicted from the pool may have been written without the rest of the tree.
+    force opens it anyway to salvage its keys, e.g. into a new file with
+    bulk_load, the tree may then miss keys or be out of order
+    """
+    def __init__(self, path, t=None, page_size=None, pool_size=1024, logger=None, force=False):
+        self.pager = Pager(path, t, page_size, pool_size, force)
+        self.t = self.pager.t
+        self.compact = True
+        self.typecode = 'q'
+        self.logger = logger
+        self.order_statistics = False
+        if self.pager.root_id == 0:
+            self.root = self.new_node()
+
+    @property
+    def root(self):
+        return self.pager.get(self.pager.root_id)
+
+    @root.setter
+    def root(self, node):
+        # bulk_load passes page ids, see packed
+        self.pager.root_id = node if type(node) is int else node.page_id
+        self.pager.write_header()
+
+    def new_node(self):
+        """
+        Allocate a page for an empty node
+        """
+        return self.pager.allocate()
+
+    def load(self, keys):
+        """
+        Build the levels for bulk_load into a file holding an empty tree and
+        free the page of the empty root the loaded root replaces
+        """
+        placeholder = self.pager.root_id
+        root = self.root
+        if root.count != 0 or not root.is_leaf():
+            self.close()
+            raise ValueError('bulk_load needs a new file or one holding an empty tree')
+        super().load(keys)
+        if self.pager.root_id != placeholder:
+            self.pager.free(placeholder)
+
+    def packed(self, node):
+        """
+        Write a node finished by bulk_load to its page and evict it, so that
+        loading keeps only the node being packed in the pool
+        """
+        self.pager.evict(node.page_id)
+        return node.page_id
+
+    def range(self, lo=None, hi=None):
+        """
+        Lazily yield keys with lo <= key < hi in ascending order, evicting
+        nodes the pool has no room for while scanning. The scan only reads,
+        so nodes still on its stack stay valid after they were evicted
+        """
+        for key in super().range(lo, hi):
+            self.pager.trim()
+            yield key
+        self.pager.trim()
+
+    def search(self, key):
+        """
+        Search for key in BTree
+        """
+        result = super().search(key)
+        self.pager.trim()
+        return result
+
+    def insert(self, key):
+        """
+        Insert key into BTree, returns False if key already exists
+        """
+        inserted = super().insert(key)
+        self.pager.trim()
+        return inserted
+
+    def search_many(self, keys):
+        """
+        Search for a batch of keys
+        """
+        result = super().search_many(keys)
+        self.pager.trim()
+        return result
+
+    def insert_many(self, keys):
+        """
+        Insert a batch of keys
+        """
+        result = super().insert_many(keys)
+        self.pager.trim()
+        return result
+
+    def delete(self, key):
+        """
+        Delete key from BTree, returns False if key does not exist
+        """
+        deleted = super().delete(key)
+        self.pager.trim()
+        return deleted
+
+    def merge_node(self, node, index):
+        """
+        Merge two nodes based on index and release the pages left unused
+        """
+        old_root = self.pager.root_id
+        right_id = node.link.ids[index+1]
+        left = super().merge_node(node, index)
+        self.pager.free(right_id)
+        if self.pager.root_id != old_root:
+            self.pager.free(old_root)
+        return left
+
+    def flush(self):
+        """
+        Write all changed pages and the header back to the file
+        """
+        self.pager.flush()
+
+    def close(self):
+        """
+        Flush and close the underlying file
+        """
+        self.pager.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class DiskNode(BaseNode):
+    """
+    Node loaded from a page, links are kept as page ids
+    """
+    __slots__ = ('t', 'count', 'key', 'link', 'page_id')
+
+    def __init__(self, t, page_id, pager):
+        self.t = t
+        self.count = 0
+        self.key = array('q', [0]) * (2*t-1)
+        self.link = PageLinks(array('q', [0]) * (2*t), pager)
+        self.page_id = page_id
+
+    def is_leaf(self):
+        # check page id directly so that no child page has to be loaded
+        return self.link.ids[0] == 0
+
+    def new_sibling(self):
+        """
+        Create an empty node on a new page
+        """
+        return self.link.pager.allocate()
+
+
+class PageLinks:
+    """
+    Child links of a DiskNode. Single items are resolved to nodes through the
+    buffer pool, slices are copied as raw page ids without loading children
+    """
+    __slots__ = ('ids', 'pager')
+
+    def __init__(self, ids, pager):
+        self.ids = ids
+        self.pager = pager
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if type(index) is slice:
+            return self.ids[index]
+        page_id = self.ids[index]
+        if page_id == 0:
+            return None
+        return self.pager.get(page_id)
+
+    def __setitem__(self, index, value):
+        if type(index) is slice:
+            if type(value) is not array:
+                value = array('q', [0 if node is None else node.page_id for node in value])
+            self.ids[index] = value
+        elif type(value) is int:
+            # page id of a node that is not in the pool, see DiskBTree.packed
+            self.ids[index] = value
+        else:
+            self.ids[index] = 0 if value is None else value.page_id
+
+
+class Pager:
+    """
+    Maps pages of the file with mmap and keeps an LRU pool of decoded nodes.
+    Pages are only evicted in trim(), which DiskBTree calls between operations
+    so that no node in use is dropped while it is being changed
+    """
+    def __init__(self, path, t=None, page_size=None, pool_size=1024, force=False):
+        self.pool = OrderedDict() # page id -> DiskNode, least recently used first
+        self.pool_size = pool_size
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        self.file = open(path, 'r+b' if exists else 'w+b')
+
+        if exists:
+            # reopen an existing tree from its header
+            self.mm = mmap.mmap(self.file.fileno(), 0)
+            magic, self.t, self.page_size, self.root_id, self.page_count, self.free_id, clean = HEADER.unpack_from(self.mm, 0)
+            if magic != MAGIC:
+                self.mm.close()
+                self.file.close()
+                raise ValueError(f'{path} is not a BTree file')
+            if not clean and not force:
+                self.mm.close()
+                self.file.close()
+                raise ValueError(f'{path} was changed after its last flush, its pages may not form a consistent tree')
+            self.clean = bool(clean)
+        else:
+            if t is None:
+                # largest degree whose node fits into the page
+                page_size = page_size or 4096
+                t = page_size // 32
+            self.t = t
+            self.page_size = max(page_size or 0, self.node_size(t), HEADER.size)
+            if self.node_size(t) > self.page_size:
+                raise ValueError(f'page size {page_size} is too small for degree {t}')
+            self.root_id = 0
+            self.page_count = 1
+            self.free_id = 0
+            self.file.truncate(self.page_size * 64)
+            self.mm = mmap.mmap(self.file.fileno(), 0)
+            self.clean = False
+            self.write_header()
+
+    @staticmethod
+    def node_size(t):
+        """
+        Bytes needed by a node of degree t: count, 2t-1 keys and 2t links
+        """
+        return COUNT.size + (2*t-1)*8 + 2*t*8
+
+    def write_header(self):
+        """
+        Write the header, called whenever the root, page count or free list changes
+        """
+        self.touch()
+        self.pack_header()
+
+    def pack_header(self):
+        HEADER.pack_into(self.mm, 0, MAGIC, self.t, self.page_size, self.root_id, self.page_count, self.free_id, self.clean)
+
+    def touch(self):
+        """
+        Mark a clean file dirty before its first change after a flush. The
+        mark is synced before any page changes, so a crash in between is
+        detected on reopen
+        """
+        if self.clean:
+            self.clean = False
+            self.pack_header()
+            self.mm.flush()
+
+    def get(self, page_id):
+        """
+        Get node of a page from the pool, reading it from the file on a miss
+        """
+        node = self.pool.get(page_id)
+        if node is not None:
+            self.pool.move_to_end(page_id)
+            return node
+
+        node = DiskNode(self.t, page_id, self)
+        offset = page_id * self.page_size
+        node.count = COUNT.unpack_from(self.mm, offset)[0]
+        offset += COUNT.size
+        key_end = offset + (2*self.t-1)*8
+        node.key = array('q', self.mm[offset:key_end])
+        node.link.ids = array('q', self.mm[key_end:key_end + 2*self.t*8])
+        if sys.byteorder == 'big':
+            node.key.byteswap()
+            node.link.ids.byteswap()
+        self.pool[page_id] = node
+        return node
+
+    def encode(self, node):
+        """
+        Encode node into the bytes of its page
+        """
+        key = node.key
+        ids = node.link.ids
+        if sys.byteorder == 'big':
+            key = array('q', key)
+            key.byteswap()
+            ids = array('q', ids)
+            ids.byteswap()
+        return COUNT.pack(node.count) + key.tobytes() + ids.tobytes()
+
+    def write_back(self, node):
+        """
+        Write node to its page if it differs from what is stored
+        """
+        data = self.encode(node)
+        offset = node.page_id * self.page_size
+        if self.mm[offset:offset+len(data)] != data:
+            self.touch()
+            self.mm[offset:offset+len(data)] = data
+
+    def allocate(self):
+        """
+        Get an empty node on a free page, growing the file when needed
+        """
+        if self.free_id != 0:
+            # reuse page from the free list, its first key slot links to the next free page
+            page_id = self.free_id
+            self.free_id = struct.unpack_from('<q', self.mm, page_id * self.page_size + COUNT.size)[0]
+        else:
+            page_id = self.page_count
+            self.page_count += 1
+            if self.page_count * self.page_size > len(self.mm):
+                self.grow(self.page_count * self.page_size)
+
+        self.write_header()
+
+        node = DiskNode(self.t, page_id, self)
+        self.pool[page_id] = node
+        return node
+
+    def free(self, page_id):
+        """
+        Put page on the free list
+        """
+        self.pool.pop(page_id, None)
+        self.touch()
+        offset = page_id * self.page_size
+        COUNT.pack_into(self.mm, offset, FREE_PAGE)
+        struct.pack_into('<q', self.mm, offset + COUNT.size, self.free_id)
+        self.free_id = page_id
+        self.write_header()
+
+    def grow(self, size):
+        """
+        Enlarge the file to at least size bytes and map it again
+        """
+        self.mm.close()
+        self.file.truncate(max(size, 2*self.page_count*self.page_size))
+        self.mm = mmap.mmap(self.file.fileno(), 0)
+
+    def evict(self, page_id):
+        """
+        Write back the node of a page and drop it from the pool
+        """
+        node = self.pool.pop(page_id, None)
+        if node is not None:
+            self.write_back(node)
+
+    def trim(self):
+        """
+        Evict least recently used nodes until the pool fits its size
+        """
+        while len(self.pool) > self.pool_size:
+            _, node = self.pool.popitem(last=False)
+            self.write_back(node)
+
+    def flush(self):
+        """
+        Write back every node in the pool and sync the file, then mark it
+        clean once the pages are on disk
+        """
+        for node in self.pool.values():
+            self.write_back(node)
+        self.mm.flush()
+        self.clean = True
+        self.pack_header()
+        self.mm.flush()
+
+    def close(self):
+        self.flush()
+        self.pool.clear()
+        self.mm.close()
+        self.file.close()
@@ -1,24 +1,43 @@
-from suffix_array import SuffixTree
+from suffix_array import SuffixTree, suffix_array
 from bitarray import bitarray
+from bitarray.util import int2ba
 import heapq
 from math import log
-import sys
+from array import array
+from zlib import crc32
+import argparse
+import os
+import time
+from functools import partial
+from itertools import groupby
+from collections import Counter
+import BWT_block_container as container
+import elias_omega
 
-def BWT(string):
+# symbols for runs of move-to-front zeros, a value v is written as v+1
+RUNA = 0
+RUNB = 1
+
+def BWT(string, use_suffix_tree=False):
     """
-    create burrow wheeler's transform of the string
+    create burrow wheeler's transform of the string.
+    The suffix array is built with SA-IS unless use_suffix_tree is set,
+    which builds it from ukkonen's suffix tree instead
     """
-    # create suffix array using ukkonen's algorithm
-    suffixtree = SuffixTree(string)
-    suffix_array = suffixtree.traverse_inorder(suffixtree.root)
-    bwt_string = [0 for _ in range(len(suffix_array))]
+    if use_suffix_tree:
+        # create suffix array using ukkonen's algorithm
+        suffixtree = SuffixTree(string)
+        sa = suffixtree.traverse_inorder(suffixtree.root)
+    else:
+        sa = suffix_array(string)
+    bwt_string = array('l', [0]) * len(sa)
 
     # create bwt string
-    for i in range(len(suffix_array)):
-        bwt_string[i] = (suffix_array[i] -1) if suffix_array[i] != 0 else len(string)-1
+    for i in range(len(sa)):
+        bwt_string[i] = (sa[i] -1) if sa[i] != 0 else len(string)-1
 
     # count number of different characters in the string
-    distinct_char = [i for i in range(len(suffixtree.root.edges)) if suffixtree.root.edges[i] is not None ]
+    distinct_char = sorted(ord(c)-33 for c in set(string))
 
     return bwt_string, distinct_char
 
@@ -37,18 +56,7 @@ def elias_omega_encoder(number):
     """
     Elias omega encoding of a number
     """
-    binary = dec_to_bin(number)
-    stack = [binary]
-    number = len(binary) -1
-    while number > 0:
-        binary = dec_to_bin(number)
-        binary[0] = 0
-        number = len(binary) - 1
-        stack.append(binary)
-    result = bitarray()
-    while len(stack) > 0:
-        result.extend(stack.pop())
-    return result
+    return elias_omega.encode(number)
 
 def count_distinct_char(string):
     """
@@ -72,19 +80,57 @@ def char_to_ascii(character):
         ascii_bin = x
     return ascii_bin
 
-class huffman_node:
+def canonical_codes(code_lengths):
     """
-    A node in the huffman tree
+    Assign canonical huffman codes from (character, code length) pairs.
+    Codes are counted up in order of length and then character, so the
+    lengths alone are enough to rebuild them
     """
-    def __init__(self, frequency, character):
-        self.character = character # character in the node
-        self.frequency = frequency # frequency of the character
+    codes = []
+    code = 0
+    previous_length = 0
+    for character, length in sorted(code_lengths, key=lambda pair: (pair[1], pair[0])):
+        code <<= length - previous_length
+        codes.append((character, int2ba(code, length)))
+        code += 1
+        previous_length = length
+    return codes
 
-    def __lt__(self, other):
-        """
-        Comparison function for the huffman node
-        """
-        return self.frequency < other.frequency or (self.frequency == other.frequency and len(self.character) < len(other.character))
+def huffman_code_lengths(frequency):
+    """
+    Code length of every symbol of a huffman tree over the frequencies, 0 for
+    unused symbols. The tree is built on node ids in O(sigma log sigma)
+    """
+    heap = []
+    size = len(frequency)
+
+    # insert all symbols in the heap, node id of a symbol is its index
+    for i in range(size):
+        if frequency[i] > 0:
+            heapq.heappush(heap, (frequency[i], i))
+
+    # create huffman tree, internal nodes get ids from size upwards
+    parent = [-1 for _ in range(2*size)]
+    next_id = size
+    while len(heap) > 1:
+        # get two nodes with minimum frequency
+        left = heapq.heappop(heap)
+        right = heapq.heappop(heap)
+        parent[left[1]] = next_id
+        parent[right[1]] = next_id
+
+        # create a new node with combined frequency
+        heapq.heappush(heap, (left[0] + right[0], next_id))
+        next_id += 1
+
+    # depth of each node, parents always have larger ids than their children
+    depth = [0 for _ in range(2*size)]
+    for i in range(next_id-1, -1, -1):
+        if parent[i] != -1:
+            depth[i] = depth[parent[i]] + 1
+
+    # a single symbol still needs a code of one bit
+    return [max(depth[i], 1) if frequency[i] > 0 else 0 for i in range(size)]
 
 class huffman_encode_tree:
     """
@@ -102,55 +148,106 @@ class huffman_encode_tree:
     
     def huffman_encoding(self):
         """
-        Encode the string using huffman encoding
+        Encode the string using canonical huffman codes built from the code
+        lengths of the huffman tree
         """
-        heap = []
-
-        # insert all characters in the heap
-        for i in range(94):
-            if self.character_count[i] > 0:
-                heapq.heappush(heap, huffman_node(self.character_count[i],chr(i+33)))
-
-        # create huffman tree
-        while len(heap) > 1:
-            # get two nodes with minimum frequency
-            left = heapq.heappop(heap)
-            right = heapq.heappop(heap)
-
-            # add 0 to left and 1 to right character
-            for i in left.character:
-                new = bitarray('0')
-                new.extend(self.encode_table[ord(i)-33])
-                self.encode_table[ord(i)-33] = new
-            for i in right.character:
-                new = bitarray('1')
-                new.extend(self.encode_table[ord(i)-33])
-                self.encode_table[ord(i)-33] = new
-
-            # create a new node with combined frequency                
-            combined = huffman_node(left.frequency + right.frequency, left.character + right.character)
-            heapq.heappush(heap, combined)
-        
+        lengths = huffman_code_lengths(self.character_count)
+        self.code_lengths = [(chr(i+33), lengths[i]) for i in range(94) if lengths[i] > 0]
+        for character, code in canonical_codes(self.code_lengths):
+            self.encode_table[ord(character)-33] = code
+
         # create encoding for the entire string
         for i in self.string:
             self.result.extend(self.encode_table[ord(i)-33])
-        
 
-        
-    def print_huffman_tree(self, node, level=0):
-        """
-        Function to pretty print the huffman tree recursively
-        """
-        print('|-'*level,node.character, node.frequency)
-        if node.left is not None:
-            self.print_huffman_tree(node.left, level+1)
-        if node.right is not None:
-            self.print_huffman_tree(node.right, level+1)
-    
-def generate_bit_stream(string):
+def bwt_runs(characters):
+    """
+    Yield (character, count) for every run of the same character in the bwt
+    """
+    for character, run in groupby(characters):
+        yield character, sum(1 for _ in run)
+
+def zero_run(symbols, zeros):
+    """
+    Append a run of zeros in bijective base 2, RUNA is digit 1 and RUNB digit 2
+    """
+    while zeros > 0:
+        if zeros & 1:
+            symbols.append(RUNA)
+            zeros = (zeros - 1) >> 1
+        else:
+            symbols.append(RUNB)
+            zeros = (zeros - 2) >> 1
+
+def move_to_front(runs, alphabet):
+    """
+    Move-to-front transform of the bwt runs starting from the sorted
+    alphabet, with runs of zeros written as RUNA/RUNB symbols as in bzip2
+    """
+    order = list(alphabet)
+    symbols = []
+    zeros = 0
+
+    # a run of one character gives its move-to-front value followed by zeros
+    for character, count in runs:
+        value = order.index(character)
+        if value == 0:
+            zeros += count
+            continue
+        zero_run(symbols, zeros)
+        symbols.append(value + 1)
+        order.pop(value)
+        order.insert(0, character)
+        zeros = count - 1
+    zero_run(symbols, zeros)
+    return symbols
+
+def encode_mtf(result, symbols, alphabet_size):
+    """
+    Add the code lengths plus one and the canonical huffman codes of the
+    move-to-front symbols (RUNA, RUNB and values 1 to alphabet_size-1)
+    """
+    frequency = [0 for _ in range(alphabet_size+1)]
+    for i in symbols:
+        frequency[i] += 1
+    lengths = huffman_code_lengths(frequency)
+
+    elias_omega.encode_many([length + 1 for length in lengths], result)
+    codes = canonical_codes([(i, lengths[i]) for i in range(len(lengths)) if lengths[i] > 0])
+    result.encode(dict(codes), symbols)
+
+def record_time(timings, stage, start):
+    """
+    Add the time since start to stage of the timings dict if there is one,
+    returns the current time as start of the next stage
+    """
+    now = time.perf_counter()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0) + now - start
+    return now
+
+def encode_runs(result, runs, huffman_codes, timings=None):
+    """
+    Add the huffman code and elias omega run length of every bwt run, with
+    huffman_codes mapping each character to its code as a string. All run
+    lengths are coded in one call and the bits are added at once
+    """
+    runs = list(runs)
+    start = time.perf_counter()
+    run_codes = elias_omega.codes([count for _, count in runs])
+    start = record_time(timings, 'elias', start)
+    result.extend(''.join([huffman_codes[runs[i][0]] + run_codes[i] for i in range(len(runs))]))
+    record_time(timings, 'huffman', start)
+
+def generate_bit_stream(string, use_suffix_tree=False, mtf=False):
+    """
+    Encode the string into a bitstream. With mtf the bwt goes through the
+    move-to-front and zero run stage before huffman coding, otherwise every
+    run of the bwt is written as huffman code and elias omega run length
+    """
     result = bitarray()
     # create bwt of the string
-    bwt_result, distinct_char = BWT(string)
+    bwt_result, distinct_char = BWT(string, use_suffix_tree)
 
     # encode the length of the bwt and number of distinct characters
     elias_bwt_length = elias_omega_encoder(len(bwt_result))
@@ -160,45 +257,128 @@ def generate_bit_stream(string):
     result.extend(elias_bwt_length)
     result.extend(elias_distinct_char)
 
-    # encode the bwt string
-    huffman_table = huffman_encode_tree(string).encode_table
+    if mtf:
+        # add the character set, then the move-to-front symbols
+        for i in distinct_char:
+            result.extend(char_to_ascii(chr(i+33)))
+        runs = bwt_runs(map(string.__getitem__, bwt_result))
+        symbols = move_to_front(runs, [chr(i+33) for i in distinct_char])
+        encode_mtf(result, symbols, len(distinct_char))
+    else:
+        # encode the bwt string
+        huffman_table = huffman_encode_tree(string).encode_table
+
+        # add each character into bitstream, the decoder rebuilds the
+        # canonical huffman codes from the code lengths
+        for i in distinct_char:
+            # add ascii of the character
+            result.extend(char_to_ascii(chr(i+33)))
+            # add length of the huffman code
+            result.extend(elias_omega_encoder(len(huffman_table[i])))
+
+        # add each run of the bwt string into the bitstream
+        huffman_codes = {chr(i+33): huffman_table[i].to01() for i in distinct_char}
+        encode_runs(result, bwt_runs(map(string.__getitem__, bwt_result)), huffman_codes)
+
+    # add padding to the end bitstream to become full bytes
+    result += bitarray('0'*(8-len(result)%8))
+
+    return result
 
-    # add each character into bitstream
-    for i in distinct_char:
-        # add ascii of the character
-        result.extend(char_to_ascii(chr(i+33)))
-        # add length of the huffman code
-        result.extend(elias_omega_encoder(len(huffman_table[i])))
-        # add huffman code
-        result.extend(huffman_table[i])
+def byte_BWT(data):
+    """
+    create burrow wheeler's transform of bytes with an out of band sentinel
+    that is smaller than every byte. The sentinel is left out of the bwt,
+    returns the bwt and the row of the sorted rotations it belongs to
+    """
+    sa = suffix_array(data)
 
-    pointer = 0
+    # row 0 is the sentinel suffix, row i the suffix sa[i-1]
+    bwt = bytearray(data[i-1] for i in sa)
+    primary_index = sa.index(0) + 1
+    del bwt[primary_index-1]
+    bwt.insert(0, data[-1])
+    return bytes(bwt), primary_index
 
-    # add each character in the bwt string into the bitstream
-    while pointer < len(bwt_result):
-        # get the character to encode
-        character = string[bwt_result[pointer]]
-        count = 1
+def generate_byte_stream(data, mtf=False, timings=None):
+    """
+    Encode bytes into a bitstream over the full 256 byte alphabet. The
+    bitstream starts with the length plus one, then the row of the
+    sentinel and the character set as 8 bit bytes, the rest is coded as
+    in generate_bit_stream. Seconds spent per stage are added to the
+    timings dict if one is given
+    """
+    data = memoryview(data)
+    result = bitarray()
+    result.extend(elias_omega_encoder(len(data)+1))
 
-        # count the number of same characters
-        while pointer < len(bwt_result)-1 and string[bwt_result[pointer+1]] == character:
-            count += 1
-            pointer += 1
+    if len(data) > 0:
+        start = time.perf_counter()
+        bwt, primary_index = byte_BWT(data)
+        start = record_time(timings, 'bwt', start)
+        distinct_char = sorted(set(bwt))
+        result.extend(elias_omega_encoder(primary_index))
+        result.extend(elias_omega_encoder(len(distinct_char)))
 
-        # get huffman code of the character
-        huffman_code = huffman_table[ord(character)-33]
+        if mtf:
+            for i in distinct_char:
+                result.extend(int2ba(i, 8))
+            symbols = move_to_front(bwt_runs(bwt), distinct_char)
+            start = record_time(timings, 'mtf', start)
+            encode_mtf(result, symbols, len(distinct_char))
+            record_time(timings, 'huffman', start)
+        else:
+            # canonical huffman codes of the bytes
+            character_count = Counter(bwt)
+            lengths = huffman_code_lengths([character_count[i] for i in range(256)])
+            for i in distinct_char:
+                result.extend(int2ba(i, 8))
+                result.extend(elias_omega_encoder(lengths[i]))
+            huffman_codes = {i: code.to01() for i, code in canonical_codes([(i, lengths[i]) for i in distinct_char])}
+            record_time(timings, 'huffman', start)
 
-        # add huffman code to the bitstream
-        result.extend(huffman_code)
-        # add count of the character to the bitstream
-        result.extend(elias_omega_encoder(count))
-        pointer += 1
+            # add each run of the bwt into the bitstream
+            encode_runs(result, bwt_runs(bwt), huffman_codes, timings)
 
     # add padding to the end bitstream to become full bytes
     result += bitarray('0'*(8-len(result)%8))
 
     return result
 
+def check_text(block):
+    """
+    Raise ValueError if a text block has a character that text mode cannot
+    code. Characters are indexed from ! and the $ terminator has to be
+    unique and smaller than all others, which leaves % to ~
+    """
+    for character in set(block):
+        if not ord('$') < ord(character) <= ord('~'):
+            raise ValueError(f'unsupported character {character!r} in text block, use --binary for this input')
+
+def compress_block(block, mtf=False, binary=False):
+    """
+    Compress one block, text blocks are terminated with $ and binary
+    blocks are bytes. Returns the coded bytes and the checksum of the block
+    """
+    if binary:
+        return generate_byte_stream(block, mtf).tobytes(), crc32(block)
+    check_text(block)
+    return generate_bit_stream(block + '$', mtf=mtf).tobytes(), crc32(block.encode())
+
+def compress_stream(infile, outfile, block_size=container.DEFAULT_BLOCK_SIZE, jobs=1, mtf=False, binary=False):
+    """
+    Compress infile into a framed block container on outfile, infile is
+    opened in binary mode for binary compression. Blocks are coded on jobs
+    processes and written in input order as they finish, only a few
+    blocks per job are held in memory
+    """
+    flags = (container.STAGE_MTF if mtf else 0) | (container.STAGE_BYTES if binary else 0)
+    container.write_file_header(outfile, block_size, flags)
+    blocks = container.read_blocks(infile, block_size)
+    for payload, checksum in container.map_blocks(partial(compress_block, mtf=mtf, binary=binary), blocks, jobs):
+        container.write_frame(outfile, payload, checksum)
+    container.write_end(outfile)
+
 def read_file(file_path: str) -> str:
     """
     Reads the contents of a file and returns it as a string.
@@ -209,10 +389,33 @@ def read_file(file_path: str) -> str:
     return line
 
 if __name__ == "__main__":
-    _, inputFile = sys.argv
-    text = read_file(inputFile)
-    result = generate_bit_stream(text[0])
-    with open("q2_encoder_output.bin", "wb") as f:
-        result.tofile(f)
-
+    parser = argparse.ArgumentParser(description='BWT, huffman and elias omega encoder')
+    parser.add_argument('inputFile')
+    parser.add_argument('--blocks', action='store_true', help='compress the whole file block by block into a framed container')
+    parser.add_argument('--block-size', type=int, default=container.DEFAULT_BLOCK_SIZE)
+    parser.add_argument('--jobs', type=int, default=1, help='number of processes compressing blocks, implies --blocks')
+    parser.add_argument('--mtf', action='store_true', help='apply move-to-front and zero run coding before huffman coding')
+    parser.add_argument('--binary', action='store_true', help='compress any bytes instead of printable ascii text ending with $')
+    args = parser.parse_args()
 
+    if args.blocks or args.jobs > 1:
+        if args.binary:
+            infile = open(args.inputFile, 'rb')
+        else:
+            infile = open(args.inputFile, 'r', newline='')
+        try:
+            with infile, open("q2_encoder_output.bin", "wb") as outfile:
+                compress_stream(infile, outfile, args.block_size, args.jobs, args.mtf, args.binary)
+        except ValueError as error:
+            # do not leave a container that cannot be decoded
+            os.remove("q2_encoder_output.bin")
+            parser.error(str(error))
+    else:
+        if args.binary:
+            with open(args.inputFile, 'rb') as f:
+                result = generate_byte_stream(f.read(), args.mtf)
+        else:
+            text = read_file(args.inputFile)
+            result = generate_bit_stream(text[0], mtf=args.mtf)
+        with open("q2_encoder_output.bin", "wb") as f:
+            result.tofile(f)
@@ -1,129 +1,271 @@
 from bitarray import bitarray
+from bitarray.util import ba2int
+from array import array
+from itertools import accumulate
+from collections import Counter
+from zlib import crc32
+import argparse
 import sys
+import time
+import BWT_block_container as container
+import elias_omega
+from functools import partial
+from BWT_Huffman_EliasOmega_Decoder import canonical_codes, record_time, RUNB
 
 class Decoder:
     """
     Decoder for the encoded bwt bitstream
     """
-    def __init__(self, codeword) -> None:
+    def __init__(self, codeword, mtf=False, binary=False, timings=None) -> None:
+        self.mtf = mtf # bwt went through move-to-front and zero run coding
+        self.timings = timings # seconds per stage are added here if given
+        self.binary = binary # bytes with an out of band sentinel instead of text
+        self.primary_index = 0 # row of the sentinel in binary mode
         self.pointer = 0 # pointer to keep track of the current position in the bitstream
         self.codeword = codeword # bitstream
+        self.data = codeword.tobytes() + bytes(8) # bitstream as bytes, padded for table lookups
         self.huffman_tree = Huffman_tree() # huffman tree to decode the characters
         self.number_of_characters = 0 # number of characters in the bwt
-        self.decoded_bwt = [] # decoded bwt
+        self.decoded_bwt = [] # decoded bwt as runs of characters
 
     def decode(self):
         """
         General function to decode the bwt bitstream
         """
-
-        self.number_of_characters = self.decompress_elias() # decompress the elias omega code to get the number of characters
+        start = time.perf_counter()
+        if self.binary:
+            # length plus one, an empty input has no bwt
+            self.number_of_characters = self.decompress_elias() - 1
+            if self.number_of_characters == 0:
+                return b''
+            self.primary_index = self.decompress_elias()
+        else:
+            self.number_of_characters = self.decompress_elias() # decompress the elias omega code to get the number of characters
         unique_char_count = self.decompress_elias() # decompress the elias omega code to get the number of unique characters
-        self.extract_character_set(unique_char_count) # decode the character set with the number of unique characters
-        self.decode_characters() # decode the characters
-        return self.invert_bwt() # invert the bwt to get the original string
+        if self.mtf:
+            self.extract_mtf_symbols(unique_char_count) # decode the character set and the symbol codes
+            self.decode_mtf() # decode the symbols and undo move-to-front
+        else:
+            self.extract_character_set(unique_char_count) # decode the character set with the number of unique characters
+            self.decode_characters() # decode the characters
+        start = record_time(self.timings, 'decode', start)
+        result = self.invert_bwt() # invert the bwt to get the original string
+        record_time(self.timings, 'invert', start)
+        return result
 
     def decompress_elias(self):
         """
         Function to decompress elias omega code
         """
-        # initialize the readlength and component
-        readlength = 1
-        component = self.codeword[self.pointer:self.pointer+readlength]
-
-        # while the first bit is not 1, keep reading
-        while component[0] != 1:
-            component[0] = 1 # flip the first bit
-            self.pointer += readlength # move the pointer
-            readlength = bin_to_dec(component) +1 # get the new readlength
-            component = self.codeword[self.pointer:self.pointer + readlength] # get the next set of bits
-
-        # move the pointer to next element
-        self.pointer += readlength
-
-        # return the decimal value of the number
-        return bin_to_dec(component)
+        number, self.pointer = elias_omega.decode(self.data, self.pointer)
+        return number
     
+    def read_character(self):
+        """
+        Read one character of the character set, a 7 bit ascii character or
+        in binary mode an 8 bit byte
+        """
+        if self.binary:
+            character = bytes([bin_to_dec(self.codeword[self.pointer:self.pointer+8])])
+            self.pointer += 8
+        else:
+            character = chr(bin_to_dec(self.codeword[self.pointer:self.pointer+7]))
+            self.pointer += 7
+        return character
+
     def extract_character_set(self, unique_char_count):
         """
-        Extract the character set 
+        Extract the character set and rebuild the canonical huffman codes
         """
-        huffman_list = []
+        code_lengths = []
 
-        # Extract all the characters and their huffman codes
+        # Extract all the characters and their huffman code lengths
         for _ in range(unique_char_count):
-            # get the ascii of character
-            character_ascii = self.codeword[self.pointer:self.pointer+7]
+            character = self.read_character()
 
-            # convert the ascii to character
-            character = chr(bin_to_dec(character_ascii))
+            # get the huffman code length
+            code_lengths.append((character, self.decompress_elias()))
 
-            # move the pointer to the code length
-            self.pointer += 7
+        # build the huffman tree and its lookup table using the character set
+        self.huffman_tree.build_tree(canonical_codes(code_lengths))
+        self.huffman_tree.build_table()
 
-            # get the huffman code length
-            huffman_code_length = self.decompress_elias()
+    def extract_mtf_symbols(self, unique_char_count):
+        """
+        Extract the character set that starts the move-to-front list and
+        rebuild the canonical huffman codes of the symbols
+        """
+        self.mtf_order = [self.read_character() for _ in range(unique_char_count)]
 
-            # get the huffman code
-            huffman_code = self.codeword[self.pointer:self.pointer+huffman_code_length]
+        # code length plus one of RUNA, RUNB and values 1 to distinct-1
+        lengths, self.pointer = elias_omega.decode_many(self.data, self.pointer, unique_char_count+1)
+        code_lengths = [(symbol, length - 1) for symbol, length in enumerate(lengths) if length > 1]
 
-            # move the pointer to the next element
-            self.pointer += huffman_code_length
-            huffman_list.append((character, huffman_code))
+        self.huffman_tree.build_tree(canonical_codes(code_lengths))
+        self.huffman_tree.build_table()
 
-        # build the huffman tree using the character set
-        self.huffman_tree.build_tree(huffman_list)
+    def decode_mtf(self):
+        """
+        Decode the move-to-front symbols into the bwt. RUNA and RUNB are the
+        digits 1 and 2 of a zero run in bijective base 2, least significant first
+        """
+        count = 0
+        data = self.data
+        huffman_tree = self.huffman_tree
+        order = self.mtf_order
+        decoded_bwt = self.decoded_bwt
+        pointer = self.pointer
+        run = 0
+        weight = 1
+
+        # a pending run always adds characters, so stop once it completes the bwt
+        while count + run < self.number_of_characters:
+            symbol, pointer = huffman_tree.decode_table(data, pointer)
+            if symbol <= RUNB:
+                run += (symbol + 1) * weight
+                weight <<= 1
+                continue
+
+            # zero run repeats the front character
+            if run > 0:
+                decoded_bwt.append(order[0] * run)
+                count += run
+                run = 0
+                weight = 1
+
+            # move the character to the front
+            character = order.pop(symbol - 1)
+            order.insert(0, character)
+            decoded_bwt.append(character)
+            count += 1
+
+        if run > 0:
+            decoded_bwt.append(order[0] * run)
+        self.pointer = pointer
 
     def decode_characters(self):
         """
-        Decode the characters using the huffman tree
+        Decode the characters using the lookup table of the huffman tree.
+        Bits are read through a small integer buffer that is refilled 32 bits
+        at a time, the run lengths are decoded from the same buffer with the
+        elias omega decode table
         """
         count = 0
+        data = self.data
+        huffman_tree = self.huffman_tree
+        table = huffman_tree.table
+        table_bits = huffman_tree.table_bits
+        mask = (1 << table_bits) - 1
+        elias_table = elias_omega.DECODE_TABLE
+        elias_bits = elias_omega.DECODE_BITS
+        decoded_bwt = self.decoded_bwt
+
+        # bit buffer holding the next nbits bits of the stream, starting at pointer
+        position = self.pointer >> 3
+        nbits = 8 - (self.pointer & 7)
+        buffer = data[position] & ((1 << nbits) - 1)
+        position += 1
 
         # decode the characters until the end of bistream
         while count < self.number_of_characters:
-            # decode the character and move the pointer
-            character, self.pointer = self.huffman_tree.decode(self.codeword, self.pointer)
-            runlength = self.decompress_elias()
+            if nbits < 32:
+                buffer = (buffer << 32) | int.from_bytes(data[position:position+4], 'big')
+                position += 4
+                nbits += 32
+
+            # decode the character with one probe of the lookup table
+            character, length = table[(buffer >> (nbits - table_bits)) & mask]
+            if type(character) is Huffman_node:
+                # code is longer than the table, continue in the tree
+                self.pointer = position*8 - nbits
+                character, self.pointer = huffman_tree.decode_table(data, self.pointer)
+                runlength = self.decompress_elias()
+                position = self.pointer >> 3
+                nbits = 8 - (self.pointer & 7)
+                buffer = data[position] & ((1 << nbits) - 1)
+                position += 1
+            else:
+                nbits -= length
+                buffer &= (1 << nbits) - 1
+
+                # decode the elias omega run length, at least 22 bits are left
+                # in the buffer so short codes take one probe of the table
+                entry = elias_table[buffer >> (nbits - elias_bits)]
+                if entry is not None:
+                    runlength, length = entry
+                    nbits -= length
+                    buffer &= (1 << nbits) - 1
+                else:
+                    readlength = 1
+                    while True:
+                        if nbits < readlength:
+                            buffer = (buffer << 32) | int.from_bytes(data[position:position+4], 'big')
+                            position += 4
+                            nbits += 32
+                        component = buffer >> (nbits - readlength)
+                        nbits -= readlength
+                        buffer &= (1 << nbits) - 1
+                        if component >> (readlength - 1):
+                            break
+                        readlength = (component | (1 << (readlength - 1))) + 1
+                    runlength = component
             count += runlength
 
-            # append the character to the decoded bwt
-            for _ in range(runlength):
-                self.decoded_bwt.append(character)
-        
+            # append the run to the decoded bwt
+            decoded_bwt.append(character * runlength)
+
+        self.pointer = position*8 - nbits
+
     def invert_bwt(self):
         """
-        Invert the bwt to get the original string
+        Invert the bwt to get the original string or bytes. Counting the
+        characters gives the row where the rotations starting with each of
+        them begin, placing the bwt positions into these buckets in order maps
+        every row of the sorted rotations to the row of the rotation that
+        starts one character later, so following it from the row starting
+        with $ reads the string front to back
         """
-        frequency_table = [0 for _ in range(91)]
-        count_table = []
-
-        # create frequency table and count table
-        for i in self.decoded_bwt:
-            frequency_table[ord(i)-36] += 1
-            count_table.append(frequency_table[ord(i)-36])
-        rank_table = [None for _ in range(91)]
-        next = 0
+        if self.binary:
+            bwt = b''.join(self.decoded_bwt)
+        else:
+            bwt = ''.join(self.decoded_bwt).encode('latin-1')
+
+        # first row of every character, the sentinel sorts below every byte
+        # and takes row 0 in binary mode
+        histogram = Counter(bwt)
+        counts = [histogram[c] for c in range(256)]
+        starts = list(accumulate(counts[:-1], initial=int(self.binary)))
+
+        # row i of the sorted rotations starts with the character at position
+        # next_row[i] of the bwt, equal characters keep their bwt order
+        length = len(bwt) + self.binary
+        next_row = array('q', bytes(8 * length))
+        if self.binary:
+            next_row[0] = self.primary_index
+            for i, c in enumerate(bwt[:self.primary_index]):
+                next_row[starts[c]] = i
+                starts[c] += 1
+            for i, c in enumerate(bwt[self.primary_index:], self.primary_index + 1):
+                next_row[starts[c]] = i
+                starts[c] += 1
+            # put the sentinel back
+            bwt = bwt[:self.primary_index] + bytes(1) + bwt[self.primary_index:]
+        else:
+            for i, c in enumerate(bwt):
+                next_row[starts[c]] = i
+                starts[c] += 1
+
+        # fill the preallocated buffer, the string ends with $
+        result = bytearray(length)
+        pointer = next_row[0]
+        for i in range(length):
+            pointer = next_row[pointer]
+            result[i] = bwt[pointer]
+        if self.binary:
+            # drop the sentinel
+            return bytes(result[:-1])
+        return result.decode('latin-1')
 
-        # create rank table
-        for i in range(len(frequency_table)):
-            if frequency_table[i] != 0:
-                if next ==0 :
-                    rank_table[i] = 1
-                    next = frequency_table[i]
-                else:
-                    rank_table[i] = next
-                    next = frequency_table[i] + next
-
-        result = "$"
-        pointer = 0
-        # invert the bwt using LF mapping
-        for i in range(len(self.decoded_bwt)-1):
-            result = self.decoded_bwt[pointer] + result
-            pointer = count_table[pointer] + rank_table[ord(self.decoded_bwt[pointer])-36] -1
-        return result
-            
-        
 
 
 
@@ -135,6 +277,8 @@ class Huffman_tree:
     """
     def __init__(self):
         self.root = Huffman_node(None)
+        self.table_bits = 0 # number of bits resolved by one table lookup
+        self.table = [] # (character, code length) or (node, table_bits) per bit pattern
 
     def build_tree(self, huffman_list):
         """
@@ -156,26 +300,63 @@ class Huffman_tree:
             # add the character to the leaf node
             current_node.character = i[0]
 
-    def decode(self, codeword, pointer):
-        """ 
-        Decode the character using the huffman tree
+    def build_table(self, max_bits=10):
         """
-        current_node = self.root
+        Build a lookup table indexed by the next table_bits bits of the stream.
+        Each entry holds the character and its code length, or for codes
+        longer than the table the node reached after table_bits bits
+        """
+        self.table_bits = min(max_bits, max(1, self.depth(self.root)))
+        self.table = []
+        for pattern in range(1 << self.table_bits):
+            current_node = self.root
+            length = 0
+            # follow the pattern from the most significant bit until a leaf
+            while current_node is not None and current_node.character is None and length < self.table_bits:
+                if (pattern >> (self.table_bits - 1 - length)) & 1 == 0:
+                    current_node = current_node.left
+                else:
+                    current_node = current_node.right
+                length += 1
+            if current_node is None:
+                # pattern is not the prefix of any code
+                self.table.append((None, length))
+            elif current_node.character is None:
+                self.table.append((current_node, length))
+            else:
+                self.table.append((current_node.character, length))
 
-        # traverse the tree until the leaf node is reached
+    def depth(self, node):
+        """
+        Length of the longest code below node
+        """
+        if node is None or node.character is not None:
+            return 0
+        return 1 + max(self.depth(node.left), self.depth(node.right))
+
+    def decode_table(self, data, pointer):
+        """
+        Decode the character at bit position pointer of data (bytes padded
+        with 3 zero bytes) with one table lookup
+        """
+        byte = pointer >> 3
+        window = int.from_bytes(data[byte:byte+3], 'big') >> (24 - self.table_bits - (pointer & 7))
+        entry, length = self.table[window & ((1 << self.table_bits) - 1)]
+        pointer += length
+        if type(entry) is not Huffman_node:
+            return entry, pointer
+
+        # code is longer than the table, continue bit by bit in the tree
+        current_node = entry
         while current_node.character is None:
-            # move to left if 0 and right if 1
-            if codeword[pointer] == 0:
+            if (data[pointer >> 3] >> (7 - (pointer & 7))) & 1 == 0:
                 current_node = current_node.left
             else:
                 current_node = current_node.right
             pointer += 1
-        
         return current_node.character, pointer
 
 
-
-
 class Huffman_node:
     """
     Node for Huffman tree
@@ -191,12 +372,44 @@ def bin_to_dec(binary):
     """
     Converts a binary number to a decimal number
     """
-    binary = binary[::-1]
-    decimal = 0
-    for i in range(len(binary)):
-        decimal += binary[i] * (2**i)
-    return decimal
+    return ba2int(binary)
     
+def decompress_block(payload, mtf=False, binary=False):
+    """
+    Decode one block of the container back into its text or bytes
+    """
+    codeword = bitarray()
+    codeword.frombytes(payload)
+    if binary:
+        return Decoder(codeword, mtf, binary).decode()
+    # drop the $ terminator added by the encoder
+    return Decoder(codeword, mtf).decode()[:-1]
+
+def decompress_frame(frame, mtf=False, binary=False):
+    """
+    Decode one (payload, checksum) frame, returns the block and whether
+    its checksum matches
+    """
+    payload, checksum = frame
+    block = decompress_block(payload, mtf, binary)
+    return block, crc32(block if binary else block.encode()) == checksum
+
+def decompress_stream(infile, outfile, jobs=1):
+    """
+    Decode a framed block container from infile into outfile, verifying the
+    checksum of every block. Containers of binary blocks need outfile opened
+    in binary mode. Blocks are decoded on jobs processes and written in
+    their original order
+    """
+    flags, _ = container.read_file_header(infile)
+    decode = partial(decompress_frame, mtf=bool(flags & container.STAGE_MTF),
+                     binary=bool(flags & container.STAGE_BYTES))
+    frames = container.read_frames(infile)
+    for index, (block, valid) in enumerate(container.map_blocks(decode, frames, jobs)):
+        if not valid:
+            raise ValueError(f'checksum mismatch in block {index}')
+        outfile.write(block)
+
 def read_file(file_path: str) -> str:
     """
     Reads the contents of a file and returns it as a string.
@@ -206,10 +419,29 @@ def read_file(file_path: str) -> str:
     return x
 
 if __name__ == "__main__":
-    _, inputFile = sys.argv
-    
+    parser = argparse.ArgumentParser(description='BWT, huffman and elias omega decoder')
+    parser.add_argument('inputFile')
+    parser.add_argument('--jobs', type=int, default=1, help='number of processes decoding blocks of a container')
+    parser.add_argument('--mtf', action='store_true', help='single stream was coded with move-to-front, containers record this themselves')
+    parser.add_argument('--binary', action='store_true', help='single stream was coded from bytes, containers record this themselves')
+    args = parser.parse_args()
+    inputFile = args.inputFile
+
+    with open(inputFile, "rb") as infile:
+        if container.is_container(infile):
+            # block container, decode block by block
+            flags, _ = container.read_file_header(infile)
+            infile.seek(0)
+            if flags & container.STAGE_BYTES:
+                outfile = open("q2_decoder_output.txt", "wb")
+            else:
+                outfile = open("q2_decoder_output.txt", "w", newline='')
+            with outfile:
+                decompress_stream(infile, outfile, args.jobs)
+            sys.exit()
+
     text = read_file(inputFile)
-    decoder = Decoder(text)
+    decoder = Decoder(text, args.mtf, args.binary)
     result = decoder.decode()
-    with open("q2_decoder_output.txt", "w") as f:
-        f.write(result)
\ No newline at end of file
+    with open("q2_decoder_output.txt", "wb" if args.binary else "w") as f:
+        f.write(result)
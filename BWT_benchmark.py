@@ -0,0 +1,203 @@
+import io
+import sys
+import json
+import time
+import random
+import resource
+import argparse
+from zlib import crc32
+from bitarray import bitarray
+from concurrent.futures import ProcessPoolExecutor
+import BWT_block_container as container
+from BWT_Huffman_EliasOmega_Decoder import generate_byte_stream
+from BWT_Huffman_EliasOmega_Encoder import Decoder
+
+CORPORA = ['random', 'logs', 'dna']
+UNITS = {'K': 1000, 'M': 1000**2, 'G': 1000**3}
+ENCODE_STAGES = ['bwt', 'mtf', 'huffman', 'elias']
+DECODE_STAGES = ['decode', 'invert']
+
+
+def parse_size(text):
+    """
+    Parse a size like 1000, 1K or 100M
+    """
+    if text[-1].upper() in UNITS:
+        return int(float(text[:-1]) * UNITS[text[-1].upper()])
+    return int(text)
+
+def random_text(size, rng):
+    """
+    Uniformly random letters, digits, spaces and newlines
+    """
+    alphabet = b'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 \n'
+    table = bytes(alphabet[i % len(alphabet)] for i in range(256))
+    return rng.randbytes(size).translate(table)
+
+def log_text(size, rng):
+    """
+    Repetitive log lines with timestamps, levels, services and request ids
+    """
+    levels = ['INFO', 'INFO', 'INFO', 'WARN', 'ERROR', 'DEBUG']
+    services = ['api', 'auth', 'billing', 'search', 'worker']
+    messages = ['request handled', 'cache miss', 'retrying connection', 'user logged in', 'job finished']
+    lines = []
+    length = 0
+    second = 0
+    while length < size:
+        second += rng.randrange(3)
+        line = (f'2024-01-01T{second // 3600 % 24:02d}:{second // 60 % 60:02d}:{second % 60:02d}Z '
+                f'{rng.choice(levels)} {rng.choice(services)} {rng.choice(messages)} '
+                f'id={rng.randrange(100000)} latency={rng.randrange(1, 500)}ms\n')
+        lines.append(line)
+        length += len(line)
+    return ''.join(lines).encode()[:size]
+
+def dna_text(size, rng, segment=1000):
+    """
+    ACGT text where half of the segments repeat an earlier one with a few
+    point mutations, like repeats in a genome
+    """
+    table = bytes(b'ACGT'[i % 4] for i in range(256))
+    segments = []
+    for _ in range(size // segment + 1):
+        if segments and rng.random() < 0.5:
+            copy = bytearray(rng.choice(segments))
+            for _ in range(segment // 100):
+                copy[rng.randrange(segment)] = b'ACGT'[rng.randrange(4)]
+            segments.append(bytes(copy))
+        else:
+            segments.append(rng.randbytes(segment).translate(table))
+    return b''.join(segments)[:size]
+
+def make_corpus(kind, size, seed=0):
+    """
+    Generate size bytes of the corpus kind
+    """
+    rng = random.Random(seed)
+    if kind == 'logs':
+        return log_text(size, rng)
+    if kind == 'dna':
+        return dna_text(size, rng)
+    return random_text(size, rng)
+
+def run_case(kind, size, mtf, block_size, seed=0):
+    """
+    Compress a generated corpus block by block into a container, decode it
+    again and check that every block round trips. Returns the sizes, the
+    throughput of every stage and the peak resident memory of the process
+    """
+    data = make_corpus(kind, size, seed)
+    flags = container.STAGE_BYTES | (container.STAGE_MTF if mtf else 0)
+
+    encode_timings = {}
+    output = io.BytesIO()
+    start = time.perf_counter()
+    container.write_file_header(output, block_size, flags)
+    for i in range(0, len(data), block_size):
+        block = data[i:i+block_size]
+        payload = generate_byte_stream(block, mtf, encode_timings).tobytes()
+        container.write_frame(output, payload, crc32(block))
+    container.write_end(output)
+    encode_seconds = time.perf_counter() - start
+
+    decode_timings = {}
+    output.seek(0)
+    round_trip = True
+    start = time.perf_counter()
+    container.read_file_header(output)
+    offset = 0
+    for payload, checksum in container.read_frames(output):
+        codeword = bitarray()
+        codeword.frombytes(payload)
+        block = Decoder(codeword, mtf, True, decode_timings).decode()
+        if block != data[offset:offset+len(block)] or crc32(block) != checksum:
+            round_trip = False
+        offset += len(block)
+    decode_seconds = time.perf_counter() - start
+    round_trip = round_trip and offset == len(data)
+
+    megabytes = len(data) / 1e6
+    compressed = len(output.getvalue())
+    return {
+        'corpus': kind,
+        'size': len(data),
+        'mtf': mtf,
+        'block_size': block_size,
+        'compressed_bytes': compressed,
+        'ratio': len(data) / compressed,
+        'bits_per_byte': 8 * compressed / max(1, len(data)),
+        'encode_mb_per_sec': megabytes / encode_seconds,
+        'decode_mb_per_sec': megabytes / decode_seconds,
+        'stage_mb_per_sec': {stage: megabytes / seconds
+                             for stage, seconds in {**encode_timings, **decode_timings}.items() if seconds > 0},
+        # kilobytes on linux, the case runs in its own process
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'round_trip': round_trip,
+    }
+
+def run_isolated(*args):
+    """
+    Run one case in a fresh process so that its peak memory is its own
+    """
+    with ProcessPoolExecutor(1) as executor:
+        return executor.submit(run_case, *args).result()
+
+def sweep(corpora, sizes, mtf_modes, block_size, seed=0):
+    """
+    Run every combination of the parameters and collect the results
+    """
+    results = []
+    for size in sizes:
+        for kind in corpora:
+            for mtf in mtf_modes:
+                result = run_isolated(kind, size, mtf, block_size, seed)
+                results.append(result)
+                stages = '  '.join(f'{stage}={result["stage_mb_per_sec"][stage]:.2f}'
+                                   for stage in ENCODE_STAGES + DECODE_STAGES if stage in result['stage_mb_per_sec'])
+                print(f"{kind:<6} size={size:<10} mtf={int(mtf)}  ratio={result['ratio']:.3f}  "
+                      f"encode={result['encode_mb_per_sec']:.2f}MB/s  decode={result['decode_mb_per_sec']:.2f}MB/s  "
+                      f"{stages}  rss={result['peak_rss_kb']}KB  "
+                      f"{'ok' if result['round_trip'] else 'ROUND TRIP FAILED'}", file=sys.stderr)
+    return results
+
+def compare(results, baseline, tolerance):
+    """
+    Cases whose output grew by more than tolerance compared to the baseline
+    results, matched on corpus, size, mtf and block size
+    """
+    previous = {(i['corpus'], i['size'], i['mtf'], i['block_size']): i for i in baseline}
+    regressions = []
+    for result in results:
+        key = (result['corpus'], result['size'], result['mtf'], result['block_size'])
+        if key in previous and result['compressed_bytes'] > previous[key]['compressed_bytes'] * (1 + tolerance):
+            regressions.append((result, previous[key]))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the BWT, huffman and elias omega codec on generated corpora')
+    parser.add_argument('--corpora', nargs='+', choices=CORPORA, default=CORPORA)
+    parser.add_argument('--sizes', type=parse_size, nargs='+', default=[parse_size(i) for i in ['1K', '10K', '100K', '1M']],
+                        help='corpus sizes such as 1K or 100M')
+    parser.add_argument('--block-size', type=parse_size, default=container.DEFAULT_BLOCK_SIZE)
+    parser.add_argument('--mtf', choices=['off', 'on', 'both'], default='both', help='move-to-front stage')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', help='earlier results to check the compressed sizes against')
+    parser.add_argument('--tolerance', type=float, default=0.01, help='allowed growth of the compressed size')
+    parser.add_argument('--output', default='bwt_benchmark.json')
+    args = parser.parse_args()
+
+    mtf_modes = {'off': [False], 'on': [True], 'both': [False, True]}[args.mtf]
+    results = sweep(args.corpora, args.sizes, mtf_modes, args.block_size, args.seed)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    failed = [i for i in results if not i['round_trip']]
+    if args.baseline:
+        with open(args.baseline) as f:
+            for result, previous in compare(results, json.load(f), args.tolerance):
+                print(f"regression: {result['corpus']} size={result['size']} mtf={int(result['mtf'])} "
+                      f"{previous['compressed_bytes']} -> {result['compressed_bytes']} bytes", file=sys.stderr)
+                failed.append(result)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,101 @@
+"""
+Framed container for block-wise BWT compression.
+
+    file header:  magic 'BWTB', flags (1 byte), block size (4 bytes)
+    every block:  payload length (4 bytes), crc32 of the block (4 bytes), payload
+    end marker:   payload length 0, crc32 0
+
+All integers are big-endian. Every payload is the bitstream of one block
+coded on its own, so blocks can be written as soon as they are finished
+and read back one at a time. The flags record which optional stages were
+applied to every block (STAGE_MTF: move-to-front and zero run coding) and
+whether the blocks are raw bytes instead of text (STAGE_BYTES)
+"""
+import struct
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+MAGIC = b'BWTB'
+FILE_HEADER = struct.Struct('>4sBI')
+FRAME_HEADER = struct.Struct('>II')
+DEFAULT_BLOCK_SIZE = 900000
+
+# flags of the file header
+STAGE_MTF = 0x01
+STAGE_BYTES = 0x02
+
+
+def write_file_header(f, block_size, flags=0):
+    f.write(FILE_HEADER.pack(MAGIC, flags, block_size))
+
+def read_file_header(f):
+    """
+    Read the file header, returns flags and block size
+    """
+    header = f.read(FILE_HEADER.size)
+    if len(header) != FILE_HEADER.size or header[:4] != MAGIC:
+        raise ValueError('not a block container')
+    _, flags, block_size = FILE_HEADER.unpack(header)
+    return flags, block_size
+
+def is_container(f):
+    """
+    Check whether a seekable file starts with the container magic
+    """
+    position = f.tell()
+    magic = f.read(len(MAGIC))
+    f.seek(position)
+    return magic == MAGIC
+
+def write_frame(f, payload, checksum):
+    f.write(FRAME_HEADER.pack(len(payload), checksum))
+    f.write(payload)
+
+def write_end(f):
+    f.write(FRAME_HEADER.pack(0, 0))
+
+def read_frames(f):
+    """
+    Yield (payload, checksum) of every block until the end marker
+    """
+    while True:
+        header = f.read(FRAME_HEADER.size)
+        if len(header) != FRAME_HEADER.size:
+            raise ValueError('truncated container, end marker missing')
+        length, checksum = FRAME_HEADER.unpack(header)
+        if length == 0:
+            return
+        payload = f.read(length)
+        if len(payload) != length:
+            raise ValueError('truncated block')
+        yield payload, checksum
+
+def read_blocks(f, block_size):
+    """
+    Yield the input file in blocks of block_size
+    """
+    while True:
+        block = f.read(block_size)
+        if not block:
+            return
+        yield block
+
+def map_blocks(function, items, jobs=1):
+    """
+    Yield function(item) for every item in input order. With jobs > 1 the
+    calls run in a process pool, with at most 2*jobs blocks in flight so
+    that memory stays bounded while the workers stay busy
+    """
+    if jobs <= 1:
+        for item in items:
+            yield function(item)
+        return
+
+    with ProcessPoolExecutor(jobs) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(function, item))
+            if len(pending) >= 2*jobs:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,117 @@
+"""
+Elias omega codes of positive integers, as used by the BWT codec.
+
+The number is written in binary, preceded by the length components, where
+each component is the bit length minus one of the next one in binary with
+its leading 1 flipped to 0. A component starting with 1 is the number itself.
+
+Codes of small integers come from precomputed tables, lists of integers are
+coded in one call and decoding reads whole windows with int.from_bytes
+instead of going bit by bit
+"""
+from bitarray import bitarray
+
+TABLE_SIZE = 1 << 12 # integers with a precomputed code
+DECODE_BITS = 12 # bits resolved by one probe of the decode table
+
+
+def code_string(number):
+    """
+    Elias omega code of number as a string of 0 and 1
+    """
+    binary = format(number, 'b')
+    code = binary
+    length = len(binary) - 1
+    while length > 0:
+        binary = format(length, 'b')
+        code = '0' + binary[1:] + code
+        length = len(binary) - 1
+    return code
+
+def build_decode_table():
+    """
+    Table indexed by the next DECODE_BITS bits giving (number, code length)
+    of the code they start with, or None if the code is longer
+    """
+    table = [None for _ in range(1 << DECODE_BITS)]
+    for number in range(1, TABLE_SIZE):
+        code = CODES[number]
+        if len(code) > DECODE_BITS:
+            continue
+        # every pattern starting with the code decodes to it
+        start = int(code, 2) << (DECODE_BITS - len(code))
+        for pattern in range(start, start + (1 << (DECODE_BITS - len(code)))):
+            table[pattern] = (number, len(code))
+    return table
+
+CODES = [''] + [code_string(i) for i in range(1, TABLE_SIZE)]
+DECODE_TABLE = build_decode_table()
+
+
+def code(number):
+    """
+    Elias omega code of number as a string, from the table if it is small
+    """
+    if number < TABLE_SIZE:
+        return CODES[number]
+    return code_string(number)
+
+def codes(numbers):
+    """
+    Elias omega codes of all numbers as strings
+    """
+    return [CODES[i] if i < TABLE_SIZE else code_string(i) for i in numbers]
+
+def encode(number):
+    """
+    Elias omega code of number
+    """
+    return bitarray(code(number))
+
+def encode_many(numbers, result=None):
+    """
+    Append the codes of all numbers to result in one call, returns result
+    """
+    if result is None:
+        result = bitarray()
+    result.extend(''.join(codes(numbers)))
+    return result
+
+def read_bits(data, pointer, count):
+    """
+    Read count bits at bit position pointer of bytes data as an integer,
+    bits past the end of data are read as 0
+    """
+    start = pointer >> 3
+    end = (pointer + count + 7) >> 3
+    window = int.from_bytes(data[start:end], 'big') << (8 * (end - start - len(data[start:end])))
+    return (window >> ((end << 3) - pointer - count)) & ((1 << count) - 1)
+
+def decode(data, pointer):
+    """
+    Decode the number at bit position pointer of bytes data, returns the
+    number and the bit position after its code
+    """
+    entry = DECODE_TABLE[read_bits(data, pointer, DECODE_BITS)]
+    if entry is not None:
+        return entry[0], pointer + entry[1]
+
+    # read components until one starts with 1
+    readlength = 1
+    while True:
+        component = read_bits(data, pointer, readlength)
+        pointer += readlength
+        if component >> (readlength - 1):
+            return component, pointer
+        readlength = (component | (1 << (readlength - 1))) + 1
+
+def decode_many(data, pointer, count):
+    """
+    Decode count consecutive numbers, returns them and the bit position
+    after the last code
+    """
+    numbers = []
+    for _ in range(count):
+        number, pointer = decode(data, pointer)
+        numbers.append(number)
+    return numbers, pointer
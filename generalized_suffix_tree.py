@@ -0,0 +1,273 @@
+import sys
+from array import array
+from bisect import bisect_right
+from suffix_tree_ukkonen_algorithm import SuffixTree, read_file
+
+SEPARATOR = '!' # ends every document
+TERMINATOR = '"' # ends the whole text, unique so that every suffix is a leaf
+
+
+class GeneralizedSuffixTree:
+    """
+    Suffix tree over many documents. The documents are concatenated, each
+    followed by SEPARATOR and the text by TERMINATOR, and indexed with one
+    ukkonen suffix tree. Leaves are tagged with (doc_id, offset).
+    Document queries work on the leaves in lexicographical order, where the
+    leaves below a node form a range: every internal node keeps the number
+    of distinct documents below it, and documents are listed with the prev
+    array of the leaf order (Muthukrishnan), so memory does not grow with
+    the number of documents.
+    Documents are added one by one and the tree is built on the first query
+    after documents were added. A document added after a query makes the
+    next query rebuild the tree over all documents, so add them in batches
+    """
+    def __init__(self, documents=(), compact=False):
+        self.compact = compact
+        self.documents = [] # text of every document
+        self.starts = [] # position of every document in the concatenated text
+        self.length = 0 # length of the concatenated documents with separators
+        self.tree = None
+        self.leaf_doc = None # doc_id of every leaf in lexicographical order, -1 for the terminator
+        self.prev = None # rank of the previous leaf of the same document, -1 if none
+        self.min_prev = None # segment tree of the rank with the smallest prev
+        for document in documents:
+            self.add_document(document)
+
+    def add_document(self, document):
+        """
+        Add a document, returns its doc_id
+        """
+        for character in document:
+            if not 35 <= ord(character) <= 126:
+                raise ValueError(f'unsupported character {character!r} in document')
+        self.documents.append(document)
+        self.starts.append(self.length)
+        self.length += len(document) + 1
+        self.tree = None
+        return len(self.documents) - 1
+
+    def build(self):
+        """
+        Build the suffix tree over all documents, the document of every leaf
+        in lexicographical order with its prev array and the number of
+        documents below every internal node
+        """
+        text = ''.join(document + SEPARATOR for document in self.documents) + TERMINATOR
+        self.tree = SuffixTree(text, self.compact)
+        self.tree.count_leaves()
+        if self.tree.storage is not None:
+            nodes = len(self.tree.storage.suffix_id)
+            self.tree.storage.leaf_rank = array('i', [0]) * nodes
+            self.tree.storage.document_count = array('i', [0]) * nodes
+
+        # leaves in lexicographical order, internal nodes get the rank of their
+        # leftmost leaf and are collected in increasing order of it
+        leaf_doc = array('i')
+        internal = []
+        for node in self.tree.preorder(self.tree.root):
+            if node.is_leaf:
+                doc_id = self.leaf_tag(node.suffix_id)[0]
+                leaf_doc.append(-1 if doc_id is None else doc_id)
+            else:
+                node.leaf_rank = len(leaf_doc)
+                internal.append(node)
+
+        # the terminator gets a prev no range starts after, so it is never listed
+        n = len(leaf_doc)
+        prev = array('i', [0]) * n
+        last = array('i', [-1]) * len(self.documents)
+        for rank in range(n):
+            doc_id = leaf_doc[rank]
+            if doc_id == -1:
+                prev[rank] = n
+            else:
+                prev[rank] = last[doc_id]
+                last[doc_id] = rank
+
+        # a leaf in the range lo to hi is the first of its document there if
+        # its prev is below lo. Counted for all nodes in increasing lo with a
+        # fenwick tree of the leaves whose prev is below lo
+        fenwick = array('i', [0]) * (n + 1)
+        by_prev = sorted(range(n), key=prev.__getitem__)
+        added = 0
+        for node in internal:
+            lo = node.leaf_rank
+            while added < n and prev[by_prev[added]] < lo:
+                i = by_prev[added] + 1
+                while i <= n:
+                    fenwick[i] += 1
+                    i += i & -i
+                added += 1
+            node.document_count = prefix_sum(fenwick, lo + node.leaf_count) - prefix_sum(fenwick, lo)
+
+        # segment tree over prev, leaves at size + rank, inner entries hold the
+        # rank with the smaller prev of their two children
+        min_prev = array('i', [0]) * (2 * n)
+        for rank in range(n):
+            min_prev[n + rank] = rank
+        for i in range(n - 1, 0, -1):
+            left, right = min_prev[2*i], min_prev[2*i+1]
+            min_prev[i] = left if prev[left] <= prev[right] else right
+
+        self.leaf_doc = leaf_doc
+        self.prev = prev
+        self.min_prev = min_prev
+        return self.tree
+
+    def get_tree(self):
+        if self.tree is None:
+            self.build()
+        return self.tree
+
+    def leaf_tag(self, suffix_id):
+        """
+        (doc_id, offset) of a position of the concatenated text, the
+        terminator belongs to no document and gives (None, None)
+        """
+        if suffix_id >= self.length:
+            return None, None
+        doc_id = bisect_right(self.starts, suffix_id) - 1
+        return doc_id, suffix_id - self.starts[doc_id]
+
+    def occurrences(self, pattern):
+        """
+        Yield (doc_id, offset) of every occurrence of pattern
+        """
+        if SEPARATOR in pattern or TERMINATOR in pattern:
+            return
+        for suffix_id in self.get_tree().iter_occurrences(pattern):
+            yield self.leaf_tag(suffix_id)
+
+    def locate(self, pattern):
+        """
+        Node at or below the end of pattern, None if it does not occur
+        """
+        if SEPARATOR in pattern or TERMINATOR in pattern:
+            return None
+        return self.get_tree().locate(pattern)
+
+    def smallest_prev(self, lo, hi):
+        """
+        Rank between lo and hi (excluded) whose leaf has the smallest prev
+        """
+        min_prev, prev = self.min_prev, self.prev
+        best = lo
+        lo += len(prev)
+        hi += len(prev)
+        while lo < hi:
+            if lo & 1:
+                if prev[min_prev[lo]] < prev[best]:
+                    best = min_prev[lo]
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                if prev[min_prev[hi]] < prev[best]:
+                    best = min_prev[hi]
+            lo >>= 1
+            hi >>= 1
+        return best
+
+    def list_documents(self, node):
+        """
+        Sorted doc_ids of the documents below a node. Every document is found
+        once, at the leftmost of its leaves in the range of the node, the
+        only ones whose prev is below the range
+        """
+        if node.is_leaf:
+            doc_id = self.leaf_tag(node.suffix_id)[0]
+            return [] if doc_id is None else [doc_id]
+        lo = node.leaf_rank
+        result = []
+        stack = [(lo, lo + node.leaf_count)]
+        while stack:
+            start, end = stack.pop()
+            if start >= end:
+                continue
+            rank = self.smallest_prev(start, end)
+            if self.prev[rank] >= lo:
+                continue
+            result.append(self.leaf_doc[rank])
+            stack.append((start, rank))
+            stack.append((rank + 1, end))
+        result.sort()
+        return result
+
+    def documents_containing(self, pattern):
+        """
+        Sorted doc_ids of the documents containing pattern, the walk is
+        O(m) and listing costs O(log n) per document
+        """
+        node = self.locate(pattern)
+        if node is None:
+            return []
+        return self.list_documents(node)
+
+    def count_documents(self, pattern):
+        """
+        Number of documents containing pattern
+        """
+        node = self.locate(pattern)
+        if node is None:
+            return 0
+        if node.is_leaf:
+            return 0 if self.leaf_tag(node.suffix_id)[0] is None else 1
+        return node.document_count
+
+    def longest_common_substring(self, min_documents=None):
+        """
+        Longest substring contained in at least min_documents documents, all
+        of them by default. Returns the substring and the sorted doc_ids
+        that contain it
+        """
+        tree = self.get_tree()
+        if min_documents is None:
+            min_documents = len(self.documents)
+
+        best_length = 0
+        best_position = 0
+        best_node = None
+        stack = [(tree.root, 0)]
+        while stack:
+            node, depth = stack.pop()
+            if node.is_leaf:
+                # a suffix alone is only contained in its own document
+                position = node.suffix_id
+                doc_id, offset = self.leaf_tag(position)
+                if doc_id is None:
+                    continue
+                length = len(self.documents[doc_id]) - offset
+                count = 1
+            else:
+                # the path label may run into a separator, only the part before
+                # it is shared by the documents below the node
+                position = node.first_leaf
+                doc_id, offset = self.leaf_tag(position)
+                length = depth if doc_id is None else min(depth, len(self.documents[doc_id]) - offset)
+                count = node.document_count
+                for edge in tree.sorted_edges(node):
+                    stack.append((edge.next_node, depth + edge.get_length()))
+            if count >= min_documents and count > 0 and (length > best_length or best_node is None):
+                best_length = length
+                best_position = position
+                best_node = node
+
+        if best_node is None:
+            return '', []
+        return tree.string[best_position:best_position+best_length], self.list_documents(best_node)
+
+def prefix_sum(fenwick, i):
+    """
+    Sum of the first i entries of a fenwick tree
+    """
+    total = 0
+    while i > 0:
+        total += fenwick[i]
+        i -= i & -i
+    return total
+
+
+if __name__ == "__main__":
+    # print the longest substring common to all document files
+    tree = GeneralizedSuffixTree(read_file(i).strip() for i in sys.argv[1:])
+    substring, doc_ids = tree.longest_common_substring()
+    print(substring)
@@ -0,0 +1,193 @@
+"""
+Suffix array, inverse suffix array and optional LCP array of a text saved
+as flat binary arrays.
+
+    header:  magic 'SIDX', byte order, item size (4 or 8), flags,
+             text length (8 bytes), crc32 of the text (4 bytes)
+    arrays:  suffix array, inverse suffix array, LCP if flags has HAS_LCP
+
+Arrays use the byte order of the machine that wrote them, int32 items
+unless the text is too long for them. Loading maps the file and casts
+memoryviews over it, so nothing is copied or parsed
+"""
+import os
+import sys
+import mmap
+import struct
+from array import array
+from zlib import crc32
+from suffix_array import suffix_array
+
+MAGIC = b'SIDX'
+HEADER = struct.Struct('=4sBBBxQI4x')
+HAS_LCP = 0x01
+TYPECODES = {4: 'i', 8: 'q'}
+
+
+class SuffixIndex:
+    """
+    Suffix array (sa), inverse suffix array (isa) and optionally the LCP
+    array of a text. Built indexes hold arrays, loaded ones memoryviews
+    over the mapped file
+    """
+    def __init__(self, sa, isa, lcp=None, checksum=0):
+        self.sa = sa
+        self.isa = isa # rank - 1 of the suffix starting at every position
+        self.lcp = lcp # lcp[i] is the longest common prefix of suffixes sa[i-1] and sa[i]
+        self.checksum = checksum # crc32 of the text
+        self.mapping = None
+        self.file = None
+
+    @classmethod
+    def build(cls, text, lcp=False):
+        """
+        Build the index of text, the suffix array comes from SA-IS
+        """
+        return cls.from_suffix_array(text, suffix_array(text), lcp)
+
+    @classmethod
+    def from_tree(cls, tree, lcp=False):
+        """
+        Build the index from the leaves of a built SuffixTree
+        """
+        return cls.from_suffix_array(tree.string, tree.traverse_inorder(tree.root), lcp)
+
+    @classmethod
+    def from_suffix_array(cls, text, sa, lcp=False):
+        typecode = TYPECODES[4] if len(text) < 2**31 else TYPECODES[8]
+        sa = array(typecode, sa)
+        isa = array(typecode, bytes(sa.itemsize * len(sa)))
+        for i in range(len(sa)):
+            isa[sa[i]] = i
+        index = cls(sa, isa, checksum=text_checksum(text))
+        if lcp:
+            index.lcp = kasai(text, sa, isa)
+        return index
+
+    def suffix_rank(self, positions):
+        """
+        Rank of the suffix starting at every 1-based position, like
+        SuffixTree.suffix_rank
+        """
+        isa = self.isa
+        return [isa[i - 1] + 1 for i in positions]
+
+    def matches(self, text):
+        """
+        Check whether the index was built from text
+        """
+        return len(self.sa) == len(text) and self.checksum == text_checksum(text)
+
+    def save(self, path):
+        """
+        Write the index to path, replacing the file atomically
+        """
+        flags = HAS_LCP if self.lcp is not None else 0
+        itemsize = self.sa.itemsize
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, sys.byteorder == 'big', itemsize, flags, len(self.sa), self.checksum))
+            for values in (self.sa, self.isa, self.lcp):
+                if values is not None:
+                    f.write(memoryview(values).cast('B'))
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Map an index file, the arrays are views of the mapping
+        """
+        f = open(path, 'rb')
+        try:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            f.close()
+            raise ValueError('not a suffix index')
+        if len(mapping) < HEADER.size or mapping[:4] != MAGIC:
+            mapping.close()
+            f.close()
+            raise ValueError('not a suffix index')
+        _, big_endian, itemsize, flags, length, checksum = HEADER.unpack_from(mapping)
+        size = length * itemsize
+        arrays = 3 if flags & HAS_LCP else 2
+        if big_endian != (sys.byteorder == 'big') or itemsize not in TYPECODES \
+                or len(mapping) != HEADER.size + arrays * size:
+            mapping.close()
+            f.close()
+            raise ValueError('suffix index of another platform or truncated')
+
+        view = memoryview(mapping)
+        typecode = TYPECODES[itemsize]
+        offset = HEADER.size
+        sa = view[offset:offset+size].cast(typecode)
+        isa = view[offset+size:offset+2*size].cast(typecode)
+        lcp = view[offset+2*size:offset+3*size].cast(typecode) if flags & HAS_LCP else None
+        view.release()
+
+        index = cls(sa, isa, lcp, checksum)
+        index.mapping = mapping
+        index.file = f
+        return index
+
+    def close(self):
+        """
+        Release the views and the mapping of a loaded index
+        """
+        if self.mapping is None:
+            return
+        for values in (self.sa, self.isa, self.lcp):
+            if values is not None:
+                values.release()
+        self.mapping.close()
+        self.file.close()
+        self.mapping = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def text_checksum(text):
+    return crc32(text.encode() if isinstance(text, str) else bytes(text))
+
+def kasai(text, sa, isa):
+    """
+    LCP array in linear time with kasai's algorithm
+    """
+    n = len(sa)
+    lcp = array(sa.typecode, bytes(sa.itemsize * n))
+    common = 0
+    for i in range(n):
+        rank = isa[i]
+        if rank == 0:
+            common = 0
+            continue
+        j = sa[rank - 1]
+        while i + common < n and j + common < n and text[i + common] == text[j + common]:
+            common += 1
+        lcp[rank] = common
+        if common > 0:
+            common -= 1
+    return lcp
+
+def open_index(path, text, lcp=False, build=None):
+    """
+    Load the index at path if it was built from text, otherwise build it
+    with build(text) (SA-IS by default), save it and load it
+    """
+    if os.path.exists(path):
+        try:
+            index = SuffixIndex.load(path)
+        except ValueError:
+            index = None
+        if index is not None:
+            if index.matches(text) and (index.lcp is not None or not lcp):
+                return index
+            index.close()
+    index = build(text) if build is not None else SuffixIndex.build(text, lcp)
+    if lcp and index.lcp is None:
+        index.lcp = kasai(text, index.sa, index.isa)
+    index.save(path)
+    return SuffixIndex.load(path)
@@ -1,4 +1,5 @@
 import sys
+from array import array
 
 class Node:
     def __init__(self, is_leaf, id=None):
@@ -9,6 +10,13 @@ class Node:
         # suffix id for the suffix
         self.suffix_id = id
         self.suffix_link = None
+        # leaves below the node and smallest suffix id among them, see count_leaves
+        self.leaf_count = 0
+        self.first_leaf = None
+        # rank of the leftmost leaf in lexicographical order and number of
+        # documents below the node, see GeneralizedSuffixTree.build
+        self.leaf_rank = 0
+        self.document_count = 0
 
 class Edge:
     # optimized edge representation
@@ -35,16 +43,230 @@ class SkipCountPointer:
         self.active_edge = edge
         self.active_length = count
 
+class CompactStorage:
+    """
+    Nodes and edges of a suffix tree kept in parallel typed arrays instead of
+    objects. The edges leaving a node form a list sorted by the index of
+    their first character, so a node only pays for the edges it has
+    """
+    def __init__(self, end):
+        self.end = end # global end pointer, stored as -1 in the edge ends
+        self.root = None # view of node 0, the only view that is compared by identity
+        # nodes
+        self.suffix_link = array('i')
+        self.suffix_id = array('i') # -1 for internal nodes
+        self.first_edge = array('i') # -1 if the node has no edges
+        # edges
+        self.start = array('i')
+        self.end_index = array('i')
+        self.next_node = array('i')
+        self.next_edge = array('i') # next edge of the same node in sorted order
+        self.key = array('B') # index of the first character of the edge
+        # filled by SuffixTree.count_leaves
+        self.leaf_count = array('i')
+        self.first_leaf = array('i')
+        # filled by GeneralizedSuffixTree.build
+        self.leaf_rank = array('i')
+        self.document_count = array('i')
+
+    def new_node(self, is_leaf, id=None):
+        self.suffix_link.append(0)
+        self.suffix_id.append(id if is_leaf else -1)
+        self.first_edge.append(-1)
+        return self.node(len(self.suffix_id) - 1)
+
+    def new_edge(self, start, end):
+        self.start.append(start)
+        self.end_index.append(-1 if type(end) == End else end)
+        self.next_node.append(-1)
+        self.next_edge.append(-1)
+        self.key.append(0)
+        return CompactEdge(self, len(self.start) - 1)
+
+    def node(self, node_id):
+        """
+        View of a node, the root always gets the same view
+        """
+        if node_id == 0 and self.root is not None:
+            return self.root
+        view = CompactNode(self, node_id)
+        if node_id == 0:
+            self.root = view
+        return view
+
+    def find_edge(self, node_id, key):
+        """
+        Edge of node starting with the character index key, -1 if there is none
+        """
+        edge = self.first_edge[node_id]
+        while edge != -1 and self.key[edge] < key:
+            edge = self.next_edge[edge]
+        if edge != -1 and self.key[edge] == key:
+            return edge
+        return -1
+
+    def set_edge(self, node_id, key, edge):
+        """
+        Insert edge into the sorted edge list of node, replacing the edge
+        with the same first character
+        """
+        self.key[edge] = key
+        previous = -1
+        current = self.first_edge[node_id]
+        while current != -1 and self.key[current] < key:
+            previous = current
+            current = self.next_edge[current]
+        if current != -1 and self.key[current] == key:
+            current = self.next_edge[current]
+        self.next_edge[edge] = current
+        if previous == -1:
+            self.first_edge[node_id] = edge
+        else:
+            self.next_edge[previous] = edge
+
+class CompactNode:
+    """
+    View of a node in CompactStorage with the attributes of Node
+    """
+    __slots__ = ('storage', 'id')
+
+    def __init__(self, storage, id):
+        self.storage = storage
+        self.id = id
+
+    @property
+    def is_leaf(self):
+        return self.storage.suffix_id[self.id] != -1
+
+    @property
+    def suffix_id(self):
+        suffix_id = self.storage.suffix_id[self.id]
+        return None if suffix_id == -1 else suffix_id
+
+    @property
+    def suffix_link(self):
+        return self.storage.node(self.storage.suffix_link[self.id])
+
+    @suffix_link.setter
+    def suffix_link(self, node):
+        self.storage.suffix_link[self.id] = node.id
+
+    @property
+    def edges(self):
+        return CompactEdges(self.storage, self.id)
+
+    @property
+    def leaf_count(self):
+        return self.storage.leaf_count[self.id]
+
+    @leaf_count.setter
+    def leaf_count(self, count):
+        self.storage.leaf_count[self.id] = count
+
+    @property
+    def first_leaf(self):
+        return self.storage.first_leaf[self.id]
+
+    @first_leaf.setter
+    def first_leaf(self, suffix_id):
+        self.storage.first_leaf[self.id] = suffix_id
+
+    @property
+    def leaf_rank(self):
+        return self.storage.leaf_rank[self.id]
+
+    @leaf_rank.setter
+    def leaf_rank(self, rank):
+        self.storage.leaf_rank[self.id] = rank
+
+    @property
+    def document_count(self):
+        return self.storage.document_count[self.id]
+
+    @document_count.setter
+    def document_count(self, count):
+        self.storage.document_count[self.id] = count
+
+class CompactEdges:
+    """
+    Edges of a compact node, indexed by character like the list of Node
+    """
+    __slots__ = ('storage', 'id')
+
+    def __init__(self, storage, id):
+        self.storage = storage
+        self.id = id
+
+    def __len__(self):
+        return 94
+
+    def __getitem__(self, key):
+        edge = self.storage.find_edge(self.id, key)
+        return None if edge == -1 else CompactEdge(self.storage, edge)
+
+    def __setitem__(self, key, edge):
+        self.storage.set_edge(self.id, key, edge.id)
+
+class CompactEdge:
+    """
+    View of an edge in CompactStorage with the attributes of Edge
+    """
+    __slots__ = ('storage', 'id')
+
+    def __init__(self, storage, id):
+        self.storage = storage
+        self.id = id
+
+    @property
+    def start(self):
+        return self.storage.start[self.id]
+
+    @property
+    def end(self):
+        end = self.storage.end_index[self.id]
+        return self.storage.end if end == -1 else end
+
+    @end.setter
+    def end(self, end):
+        self.storage.end_index[self.id] = -1 if type(end) == End else end
+
+    @property
+    def next_node(self):
+        return self.storage.node(self.storage.next_node[self.id])
+
+    @next_node.setter
+    def next_node(self, node):
+        self.storage.next_node[self.id] = node.id
+
+    def get_length(self):
+        end = self.storage.end_index[self.id]
+        if end == -1:
+            end = self.storage.end.value
+        return end - self.storage.start[self.id] + 1
+
 class SuffixTree:
-    def __init__(self, string) -> None:
+    def __init__(self, string, compact=False) -> None:
         self.end = End(-1) # global end pointer
-        self.root = Node(False)
+        # compact keeps nodes and edges in typed arrays, using far less memory
+        self.storage = CompactStorage(self.end) if compact else None
+        self.root = self.new_node(False)
         self.root.suffix_link = self.root
         self.string = string 
         self.skip_count = SkipCountPointer(self.root, None, 0) # active point and remainder
         self.previous_node = self.root
+        self.leaves_counted = False # leaf counts are cached on first use
         self.ukkonen()
 
+    def new_node(self, is_leaf, id=None):
+        if self.storage is not None:
+            return self.storage.new_node(is_leaf, id)
+        return Node(is_leaf, id)
+
+    def new_edge(self, start, end):
+        if self.storage is not None:
+            return self.storage.new_edge(start, end)
+        return Edge(start, end)
+
     def ukkonen(self):
         """
         Construct suffix tree
@@ -122,17 +344,17 @@ class SuffixTree:
     def rule_2_case_1(self, edge,i,j):
 
         # split edge in half, create new node and edge for new substring
-        new_node = Node(False)
+        new_node = self.new_node(False)
         # create default suffix link for to root for new node
         new_node.suffix_link = self.root
-        new_edge = Edge(i, self.end)
+        new_edge = self.new_edge(i, self.end)
 
         # split original edge into two
-        lower_edge = Edge(edge.start + self.skip_count.active_length, edge.end)
+        lower_edge = self.new_edge(edge.start + self.skip_count.active_length, edge.end)
         lower_edge.next_node = edge.next_node
 
         # save j as suffix id
-        new_edge.next_node = Node(True, j) 
+        new_edge.next_node = self.new_node(True, j) 
         edge.end = edge.start + self.skip_count.active_length - 1
         new_node.edges[ord(self.string[lower_edge.start]) - 33] = lower_edge
         new_node.edges[ord(self.string[new_edge.start])-33] = new_edge
@@ -149,9 +371,9 @@ class SuffixTree:
     def rule_2_case_2(self, i,j):
 
         # create new edge from active node
-        new_edge = Edge(i, self.end)
+        new_edge = self.new_edge(i, self.end)
         # save j as suffix id
-        new_edge.next_node = Node(True, j)
+        new_edge.next_node = self.new_node(True, j)
         # add new edge
         self.skip_count.active_node.edges[ord(self.string[self.skip_count.active_edge]) - 33] = new_edge
         # set suffix link from previous node to active node
@@ -174,33 +396,161 @@ class SuffixTree:
         # adjust active length for next substring
         self.skip_count.active_length += 1
 
+    def sorted_edges(self, node):
+        """
+        Edges of node in lexicographical order of their first character
+        """
+        if self.storage is not None:
+            edges = []
+            edge = self.storage.first_edge[node.id]
+            while edge != -1:
+                edges.append(CompactEdge(self.storage, edge))
+                edge = self.storage.next_edge[edge]
+            return edges
+        return [edge for edge in node.edges if edge is not None]
+
     def print_suffix_tree(self, node, level):
         """
-        Print suffix tree
+        Print suffix tree, using an explicit stack so deep trees do not hit
+        the recursion limit
         """
-        result = ""
-        for i in range(len(node.edges)):
-            if node.edges[i] is not None:
-                end = node.edges[i].end.value if type(node.edges[i].end) == End else node.edges[i].end
-                result += "\n"
-                result += "|-" * level + self.string[node.edges[i].start:end+1]
-                result += self.print_suffix_tree(node.edges[i].next_node, level + 1)
-        return result
+        result = []
+        stack = [(edge, level) for edge in reversed(self.sorted_edges(node))]
+        while stack:
+            edge, depth = stack.pop()
+            end = edge.end.value if type(edge.end) == End else edge.end
+            result.append("\n" + "|-" * depth + self.string[edge.start:end+1])
+            # children are popped in lexicographical order
+            for child in reversed(self.sorted_edges(edge.next_node)):
+                stack.append((child, depth + 1))
+        return "".join(result)
+
+    def preorder(self, node):
+        """
+        Yield node and every node below it in lexicographical preorder, using
+        an explicit stack instead of recursion
+        """
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            yield node
+            if not node.is_leaf:
+                # push edges in reverse so the smallest is visited first
+                for edge in reversed(self.sorted_edges(node)):
+                    stack.append(edge.next_node)
+
+    def iter_suffix_ids(self, node):
+        """
+        Yield the suffix id of each leaf below node in lexicographical order
+        """
+        for node in self.preorder(node):
+            if node.is_leaf:
+                yield node.suffix_id
 
     def traverse_inorder(self, node):
         """
         Traverse the entire tree to get suffix id of each leaf node
         """
-        # return suffix id if node is leaf
+        return list(self.iter_suffix_ids(node))
+
+    def children_first(self):
+        """
+        Internal nodes in an order that has every child before its parent
+        """
+        # preorder, reversed it visits every child before its parent
+        order = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node.is_leaf:
+                continue
+            order.append(node)
+            for edge in self.sorted_edges(node):
+                stack.append(edge.next_node)
+        return reversed(order)
+
+    def count_leaves(self):
+        """
+        Cache the number of leaves and the smallest suffix id below every
+        internal node, children are handled before their parent
+        """
+        if self.storage is not None:
+            nodes = len(self.storage.suffix_id)
+            self.storage.leaf_count = array('i', [0]) * nodes
+            self.storage.first_leaf = array('i', [0]) * nodes
+
+        for node in self.children_first():
+            count = 0
+            first = None
+            for edge in self.sorted_edges(node):
+                child = edge.next_node
+                if child.is_leaf:
+                    count += 1
+                    suffix_id = child.suffix_id
+                else:
+                    count += child.leaf_count
+                    suffix_id = child.first_leaf
+                if first is None or suffix_id < first:
+                    first = suffix_id
+            node.leaf_count = count
+            node.first_leaf = first
+        self.leaves_counted = True
+
+    def locate(self, pattern):
+        """
+        Walk down from the root along pattern in O(m), returns the node at or
+        below the end of the match or None if pattern does not occur
+        """
+        node = self.root
+        i = 0
+        while i < len(pattern):
+            index = ord(pattern[i]) - 33
+            edge = node.edges[index] if 0 <= index < 94 and not node.is_leaf else None
+            if edge is None:
+                return None
+            # compare the part of pattern along the edge
+            length = min(edge.get_length(), len(pattern) - i)
+            if self.string[edge.start:edge.start+length] != pattern[i:i+length]:
+                return None
+            i += length
+            node = edge.next_node
+        return node
+
+    def count(self, pattern):
+        """
+        Number of occurrences of pattern in the string, O(m) with the cached
+        leaf counts
+        """
+        node = self.locate(pattern)
+        if node is None:
+            return 0
         if node.is_leaf:
-            return [node.suffix_id]
-        result = []
-        # traverse all edges in lexicographical order
-        for i in range(len(node.edges)):
-            if node.edges[i] is not None:
-                # combine all suffix id from all edges
-                result += self.traverse_inorder(node.edges[i].next_node)
-        return result
+            return 1
+        if not self.leaves_counted:
+            self.count_leaves()
+        return node.leaf_count
+
+    def find(self, pattern):
+        """
+        Lowest position where pattern occurs in the string, -1 if it does not
+        """
+        node = self.locate(pattern)
+        if node is None:
+            return -1
+        if node.is_leaf:
+            return node.suffix_id
+        if not self.leaves_counted:
+            self.count_leaves()
+        return node.first_leaf
+
+    def iter_occurrences(self, pattern):
+        """
+        Yield every position where pattern occurs, in lexicographical order
+        of the suffixes starting there
+        """
+        node = self.locate(pattern)
+        if node is not None:
+            yield from self.iter_suffix_ids(node)
 
     def suffix_rank(self, node, ranks):
         """
@@ -232,11 +582,18 @@ def read_file(file_path: str) -> str:
     return line
 
 if __name__ == "__main__":
-    _, input1, input2 = sys.argv
+    # an optional third argument names an index file that is reused while
+    # the text stays the same
+    _, input1, input2, *index_file = sys.argv
     text = read_file(input1)
     positions = [int(i) for i in read_file(input2).split()]
-    tree = SuffixTree(text)
-    ranks = tree.suffix_rank(tree.root, positions)
+    if index_file:
+        from suffix_index import SuffixIndex, open_index
+        with open_index(index_file[0], text, build=lambda text: SuffixIndex.from_tree(SuffixTree(text))) as index:
+            ranks = index.suffix_rank(positions)
+    else:
+        tree = SuffixTree(text)
+        ranks = tree.suffix_rank(tree.root, positions)
     with open("output_q1.txt", "w") as f:
         for i in ranks:
             f.write(str(i) + "\n")